@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+Load test for the web service (web/app.py) against a stub whisper engine.
+
+Starts the app in a scratch directory with benchmarks/stub_whisper.py in place
+of bin/whisper, then runs N concurrent clients that each upload a generated wav
+(chunked protocol, or the single-POST /upload endpoint with --single-post), wait
+for completion over Socket.IO (falling back to status polling), check the job
+status and download every output. Reports latency percentiles per endpoint,
+throughput, error rate and the server's RSS, thread and file descriptor counts
+over time, and saves everything as JSON.
+
+Every job uploads different audio, so the server's fingerprint reuse never
+skips the engine; --repeat-audio sends the same file every time to load test
+the reuse path instead.
+
+Usage: python benchmarks/loadtest.py --clients 8 --jobs 4 --audio-seconds 120 --rtf 0.02
+
+Socket.IO timing needs `pip install "python-socketio[client]"`; process stats
+use /proc on Linux or psutil elsewhere.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import wave
+import random
+import socket
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from array import array
+from datetime import datetime
+
+try:
+    import socketio
+except ImportError:
+    socketio = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_WHISPER = os.path.join(PROJECT_ROOT, "benchmarks", "stub_whisper.py")
+
+
+class Recorder:
+    """Thread-safe collection of per-endpoint latencies and errors"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.requests = {}
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+
+    def record(self, endpoint, seconds, ok=True, error=None):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            if ok:
+                self.latencies.setdefault(endpoint, []).append(seconds)
+            else:
+                self.errors.setdefault(endpoint, {})
+                self.errors[endpoint][error] = self.errors[endpoint].get(error, 0) + 1
+
+    def job_done(self, ok):
+        with self.lock:
+            if ok:
+                self.jobs_completed += 1
+            else:
+                self.jobs_failed += 1
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def http(recorder, endpoint, method, url, body=None, headers=None):
+    """Perform a request, record its latency and return (status, headers, body bytes)"""
+    request = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            data = response.read()
+            recorder.record(endpoint, time.perf_counter() - started)
+            return response.status, response.headers, data
+    except urllib.error.HTTPError as e:
+        data = e.read()
+        recorder.record(endpoint, time.perf_counter() - started, ok=False, error=f"HTTP {e.code}")
+        return e.code, e.headers, data
+    except (urllib.error.URLError, OSError) as e:
+        recorder.record(endpoint, time.perf_counter() - started, ok=False, error=type(e).__name__)
+        return None, {}, b""
+
+
+def post_json(recorder, endpoint, url, payload):
+    status, headers, data = http(recorder, endpoint, "POST", url, json.dumps(payload).encode(),
+                                 {"Content-Type": "application/json"})
+    try:
+        return status, headers, json.loads(data or b"{}")
+    except ValueError:
+        return status, headers, {}
+
+
+class Client(threading.Thread):
+    """One simulated user running jobs back to back"""
+
+    def __init__(self, base_url, audio_paths, recorder, args):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        # One file per job
+        self.audio_paths = audio_paths
+        self.recorder = recorder
+        self.args = args
+        self.events = {}
+        self.condition = threading.Condition()
+        self.sio = None
+
+    def connect_socket(self):
+        if socketio is None:
+            return
+        try:
+            self.sio = socketio.Client(reconnection=False)
+            self.sio.on("transcription_progress", self.on_progress)
+            started = time.perf_counter()
+            self.sio.connect(self.base_url, transports=["websocket", "polling"], wait_timeout=10)
+            self.recorder.record("socketio_connect", time.perf_counter() - started)
+        except Exception as e:
+            self.recorder.record("socketio_connect", 0, ok=False, error=type(e).__name__)
+            self.sio = None
+
+    def on_progress(self, data):
+        if data.get("status") in ("completed", "failed"):
+            with self.condition:
+                self.events[data["job_id"]] = data["status"]
+                self.condition.notify_all()
+
+    def run(self):
+        self.connect_socket()
+        try:
+            for audio_path in self.audio_paths:
+                self.run_job(audio_path)
+        finally:
+            if self.sio:
+                self.sio.disconnect()
+
+    def upload(self, audio_path):
+        """Upload a file; retries after 429 honouring Retry-After. Returns job id or None."""
+        with open(audio_path, "rb") as f:
+            data = f.read()
+        if self.args.single_post:
+            return self.upload_single(os.path.basename(audio_path), data)
+
+        for _ in range(self.args.max_retries + 1):
+            settings = {"filename": os.path.basename(audio_path), "size": len(data),
+                        "model": self.args.model, "formats": ["txt", "srt", "vtt"],
+                        "language": "en", "use_coreml": False}
+            status, headers, body = post_json(self.recorder, "upload_init",
+                                              f"{self.base_url}/upload/init", settings)
+            if status == 429:
+                time.sleep(float(headers.get("Retry-After", 1)))
+                continue
+            if status != 200:
+                return None
+
+            upload_id, chunk_size, offset = body["upload_id"], body["chunk_size"], 0
+            while offset < len(data):
+                chunk = data[offset:offset + chunk_size]
+                status, _, reply = http(self.recorder, "upload_chunk", "PUT",
+                                        f"{self.base_url}/upload/{upload_id}/chunk?offset={offset}",
+                                        chunk, {"Content-Type": "application/octet-stream"})
+                if status != 200:
+                    return None
+                offset = json.loads(reply)["offset"]
+
+            status, _, body = post_json(self.recorder, "upload_finalize",
+                                        f"{self.base_url}/upload/{upload_id}/finalize", {})
+            return body.get("job_id") if status == 200 else None
+        return None
+
+    def upload_single(self, filename, data):
+        """Whole file in one multipart POST to /upload"""
+        boundary = uuid.uuid4().hex
+        fields = [("model", self.args.model), ("formats", "txt"), ("formats", "srt"),
+                  ("formats", "vtt"), ("language", "en"), ("use_coreml", "false")]
+        parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+                 for name, value in fields]
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                     f'Content-Type: audio/wav\r\n\r\n'.encode() + data + b"\r\n")
+        body = b"".join(parts) + f"--{boundary}--\r\n".encode()
+        headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+        for _ in range(self.args.max_retries + 1):
+            status, reply_headers, reply = http(self.recorder, "upload", "POST",
+                                                f"{self.base_url}/upload", body, headers)
+            if status == 429:
+                time.sleep(float(reply_headers.get("Retry-After", 1)))
+                continue
+            if status != 200:
+                return None
+            return json.loads(reply).get("job_id")
+        return None
+
+    def wait_for_completion(self, job_id, timeout):
+        """
+        Wait for the Socket.IO completion event while polling status between
+        waits, so a lost event shows up as an error instead of a hung client
+        """
+        started = time.perf_counter()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.sio:
+                with self.condition:
+                    self.condition.wait_for(lambda: job_id in self.events,
+                                            timeout=self.args.poll_interval)
+                    event = self.events.pop(job_id, None)
+                if event:
+                    self.recorder.record("socketio_completion", time.perf_counter() - started)
+                    return event == "completed"
+            else:
+                time.sleep(self.args.poll_interval)
+
+            status, _, body = http(self.recorder, "status", "GET",
+                                   f"{self.base_url}/job/{job_id}/status")
+            if status == 200:
+                state = json.loads(body).get("status")
+                if state in ("completed", "failed"):
+                    if self.sio:
+                        # Give the event one more interval before counting it as lost
+                        with self.condition:
+                            arrived = self.condition.wait_for(lambda: job_id in self.events,
+                                                              timeout=self.args.poll_interval)
+                            self.events.pop(job_id, None)
+                        self.recorder.record("socketio_completion", time.perf_counter() - started,
+                                             ok=arrived, error="missed")
+                    return state == "completed"
+        return False
+
+    def run_job(self, audio_path):
+        job_started = time.perf_counter()
+        job_id = self.upload(audio_path)
+        if not job_id:
+            self.recorder.job_done(False)
+            return
+
+        if not self.wait_for_completion(job_id, self.args.job_timeout):
+            self.recorder.job_done(False)
+            return
+
+        status, _, body = http(self.recorder, "status", "GET", f"{self.base_url}/job/{job_id}/status")
+        if status != 200:
+            self.recorder.job_done(False)
+            return
+
+        outputs = json.loads(body).get("result", {}).get("outputs", {})
+        ok = bool(outputs)
+        for fmt in outputs:
+            status, _, _ = http(self.recorder, "download", "GET",
+                                f"{self.base_url}/download/{job_id}/{fmt}")
+            ok = ok and status == 200
+
+        self.recorder.record("job_end_to_end", time.perf_counter() - job_started, ok=ok,
+                             error=None if ok else "incomplete")
+        self.recorder.job_done(ok)
+
+
+class ProcessMonitor(threading.Thread):
+    """Samples RSS, thread count and open file descriptors of a process"""
+
+    def __init__(self, pid, interval):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.started_at = time.time()
+
+    def sample(self):
+        if os.path.exists(f"/proc/{self.pid}"):
+            stats = {}
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    stats[key] = value.split()
+            return {
+                "rss_bytes": int(stats["VmRSS"][0]) * 1024,
+                "threads": int(stats["Threads"][0]),
+                "fds": len(os.listdir(f"/proc/{self.pid}/fd")),
+            }
+        if psutil:
+            process = psutil.Process(self.pid)
+            return {
+                "rss_bytes": process.memory_info().rss,
+                "threads": process.num_threads(),
+                "fds": process.num_fds(),
+            }
+        return None
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                sample = self.sample()
+            except (OSError, KeyError, IndexError):
+                sample = None
+            if sample is None:
+                return
+            sample["t"] = round(time.time() - self.started_at, 3)
+            self.samples.append(sample)
+            self.stopped.wait(self.interval)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_test_audio(path, seconds, seed=0):
+    """
+    Write a 16kHz mono wav of random noise whose level rises and falls like
+    speech: 250ms blocks at talking level (about -23 dBFS) or, now and then, a
+    quieter pause (about -53 dBFS), so VAD and fingerprinting see real variation
+    """
+    rng = random.Random(seed)
+    samples = array("h")
+    for _ in range(int(seconds * 4)):
+        # Independent full-scale samples, shifted down to the block's level
+        shift = 3 if rng.random() < 0.7 else 8
+        block = array("h", rng.randbytes(8000))
+        samples.extend(s >> shift for s in block)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(samples.tobytes())
+
+
+def start_server(workdir, port, args):
+    """Start web/app.py with the stub engine; returns the process once it accepts connections"""
+    os.makedirs(os.path.join(workdir, "web"), exist_ok=True)
+    models_dir = os.path.join(workdir, "models")
+    os.makedirs(models_dir, exist_ok=True)
+    for name in {args.model, "tiny", "tiny.en"}:
+        open(os.path.join(models_dir, f"ggml-{name}.bin"), "wb").close()
+
+    stub = os.path.join(workdir, "whisper")
+    with open(stub, "w") as f:
+        f.write(f"#!/bin/sh\nexec {sys.executable} {STUB_WHISPER} \"$@\"\n")
+    os.chmod(stub, 0o755)
+
+    env = dict(os.environ,
+               WHISPERTRON_WHISPER_BIN=stub,
+               WHISPERTRON_MODELS_DIR=models_dir,
+               WHISPERTRON_PORT=str(port),
+               WHISPERTRON_DEBUG="0",
+               WHISPERTRON_ALLOW_WERKZEUG="1",
+               WHISPERTRON_WORKERS=str(args.workers),
+               WHISPERTRON_MAX_QUEUE=str(args.max_queue),
+               STUB_RTF=str(args.rtf),
+               PYTHONUNBUFFERED="1")
+    log = open(os.path.join(workdir, "server.log"), "w")
+    process = subprocess.Popen([sys.executable, os.path.join(PROJECT_ROOT, "web", "app.py")],
+                               cwd=os.path.join(workdir, "web"), env=env,
+                               stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited, see {log.name}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Server did not start within 30 seconds")
+
+
+def summarize(recorder, monitor, wall_seconds, args):
+    endpoints = {}
+    for endpoint in sorted(set(recorder.requests) | set(recorder.latencies)):
+        values = recorder.latencies.get(endpoint, [])
+        errors = recorder.errors.get(endpoint, {})
+        endpoints[endpoint] = {
+            "requests": recorder.requests.get(endpoint, 0),
+            "errors": sum(errors.values()),
+            "error_breakdown": errors,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": max(values) if values else None,
+        }
+
+    total_jobs = recorder.jobs_completed + recorder.jobs_failed
+    total_requests = sum(e["requests"] for e in endpoints.values())
+    total_errors = sum(e["errors"] for e in endpoints.values())
+    samples = monitor.samples
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "socketio": socketio is not None,
+        "wall_seconds": wall_seconds,
+        "jobs": {
+            "completed": recorder.jobs_completed,
+            "failed": recorder.jobs_failed,
+            "error_rate": recorder.jobs_failed / total_jobs if total_jobs else 0.0,
+            "throughput_per_minute": recorder.jobs_completed / wall_seconds * 60,
+            "audio_hours_per_hour": recorder.jobs_completed * args.audio_seconds / wall_seconds,
+        },
+        "request_error_rate": total_errors / total_requests if total_requests else 0.0,
+        "endpoints": endpoints,
+        "server": {
+            "peak_rss_bytes": max((s["rss_bytes"] for s in samples), default=None),
+            "peak_threads": max((s["threads"] for s in samples), default=None),
+            "peak_fds": max((s["fds"] for s in samples), default=None),
+            "samples": samples,
+        },
+    }
+
+
+def print_report(report):
+    jobs = report["jobs"]
+    print(f"\nJobs: {jobs['completed']} completed, {jobs['failed']} failed "
+          f"({jobs['error_rate']:.1%} errors) in {report['wall_seconds']:.1f}s")
+    print(f"Throughput: {jobs['throughput_per_minute']:.1f} jobs/min, "
+          f"{jobs['audio_hours_per_hour']:.1f}x real time")
+    print(f"Request error rate: {report['request_error_rate']:.1%}")
+    print(f"\n{'endpoint':<22}{'requests':>9}{'errors':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, e in report["endpoints"].items():
+        fmt = lambda v: f"{v * 1000:7.0f}ms" if v is not None else "      -"
+        print(f"{name:<22}{e['requests']:>9}{e['errors']:>8}{fmt(e['p50']):>9}"
+              f"{fmt(e['p95']):>9}{fmt(e['p99']):>9}")
+    server = report["server"]
+    if server["samples"]:
+        print(f"\nServer peak: {server['peak_rss_bytes'] / 1024 / 1024:.0f} MB RSS, "
+              f"{server['peak_threads']} threads, {server['peak_fds']} fds")
+    if not report["socketio"]:
+        print("\nSocket.IO client not installed, completion was detected by polling")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the WhisperTron web service")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent clients")
+    parser.add_argument("--jobs", type=int, default=2, help="Jobs per client")
+    parser.add_argument("--audio-seconds", type=float, default=60, help="Length of the test audio")
+    parser.add_argument("--rtf", type=float, default=0.05,
+                        help="Stub engine seconds of processing per second of audio")
+    parser.add_argument("--model", default="base.en", help="Model name requested by clients")
+    parser.add_argument("--workers", type=int, default=1, help="Server transcription workers")
+    parser.add_argument("--max-queue", type=int, default=20, help="Server queue depth limit")
+    parser.add_argument("--max-retries", type=int, default=10, help="Retries after a 429")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Status poll interval")
+    parser.add_argument("--job-timeout", type=float, default=600, help="Seconds to wait per job")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Server stats interval")
+    parser.add_argument("--output", help="Results JSON (default: loadtest_<timestamp>.json)")
+    parser.add_argument("--single-post", action="store_true",
+                        help="Upload with one POST to /upload instead of the chunked protocol")
+    parser.add_argument("--repeat-audio", action="store_true",
+                        help="Upload the same audio for every job (exercises fingerprint reuse)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    args = parser.parse_args()
+
+    output = args.output or f"loadtest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    workdir = tempfile.mkdtemp(prefix="whispertron_loadtest_")
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    # Distinct audio per job unless the reuse path is what's being tested
+    audio_paths = []
+    for i in range(1 if args.repeat_audio else args.clients * args.jobs):
+        audio_paths.append(os.path.join(workdir, f"sample{i}.wav"))
+        write_test_audio(audio_paths[-1], args.audio_seconds, seed=i)
+    if args.repeat_audio:
+        audio_paths *= args.clients * args.jobs
+
+    server = start_server(workdir, port, args)
+    print(f"Server running at {base_url} (scratch dir {workdir})")
+    monitor = ProcessMonitor(server.pid, args.sample_interval)
+    monitor.start()
+
+    recorder = Recorder()
+    clients = [Client(base_url, audio_paths[i * args.jobs:(i + 1) * args.jobs], recorder, args)
+               for i in range(args.clients)]
+    started = time.perf_counter()
+    try:
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+    except KeyboardInterrupt:
+        print("Interrupted, writing partial results")
+    wall_seconds = time.perf_counter() - started
+
+    monitor.stopped.set()
+    monitor.join()
+    server.terminate()
+    try:
+        server.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+    report = summarize(recorder, monitor, wall_seconds, args)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\nResults saved to {output}")
+
+    if args.keep:
+        print(f"Scratch directory kept at {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Compare SegmentStore against a list of dicts for very long transcripts.
+
+Usage: python benchmarks/segment_store_bench.py [--segments 1000000]
+"""
+import os
+import sys
+import gc
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.segment_store import SegmentStore
+
+WORDS = ["the", "meeting", "budget", "quarter", "we", "should", "really", "follow", "up",
+         "on", "that", "next", "week", "okay", "thanks", "everyone", "so", "um", "yeah"]
+
+
+def generate(count, seed=0):
+    """Generate plausible whisper-like segments"""
+    rng = random.Random(seed)
+    t = 0
+    for _ in range(count):
+        duration = rng.randint(800, 6000)
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 14)))
+        yield t, t + duration, text
+        t += duration + rng.randint(0, 400)
+
+
+def measure(label, build):
+    """Return (result, seconds, peak bytes) for building a structure"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<34} {elapsed:8.3f}s  {current / 1024 / 1024:9.1f} MB")
+    return result
+
+
+def timed(label, fn, repeat=1):
+    """Print the mean wall time of fn over repeat runs and return its last result"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"{label:<34} {elapsed * 1000:8.2f}ms")
+    return result
+
+
+def per_query(label, fn, queries):
+    """Print the wall time per query of fn, which runs every query in queries once"""
+    started = time.perf_counter()
+    result = fn(queries)
+    elapsed = (time.perf_counter() - started) / len(queries)
+    print(f"{label:<34} {elapsed * 1000:8.4f}ms/query  ({len(queries)} queries)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SegmentStore vs list of dicts")
+    parser.add_argument("--segments", type=int, default=1_000_000, help="Number of segments")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of time range queries")
+    args = parser.parse_args()
+
+    raw = list(generate(args.segments))
+    duration = raw[-1][1]
+    rng = random.Random(1)
+    windows = [(t, t + 30000) for t in (rng.randint(0, duration) for _ in range(args.queries))]
+    print(f"{args.segments:,} segments, {duration / 3600000:.1f} hours of audio\n")
+
+    print("Build (retained memory)")
+    # Decode fresh strings per dict, as a parser would, so text memory is counted
+    dicts = measure("  list of dicts", lambda: [
+        {"start": s, "end": e, "text": t.encode("utf-8").decode("utf-8")} for s, e, t in raw
+    ])
+    store = measure("  SegmentStore", lambda: _build_store(raw))
+
+    print("\nFull iteration")
+    timed("  list of dicts", lambda: sum(len(d["text"]) for d in dicts))
+    timed("  SegmentStore (decoded)", lambda: sum(len(s.text) for s in store))
+    timed("  SegmentStore.iter_raw", lambda: sum(len(m) for _, _, m in store.iter_raw()))
+
+    print(f"\n30s time range queries")
+    # A full scan per query is too slow to run all of them
+    per_query("  list of dicts (scan)", lambda queries: [
+        [d for d in dicts if d["start"] < hi and d["end"] > lo] for lo, hi in queries
+    ], windows[:20])
+    per_query("  SegmentStore.between", lambda queries: [
+        len(store.between(lo, hi)) for lo, hi in queries
+    ], windows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "segments.bin")
+        print("\nOn-disk form")
+        timed("  save", lambda: store.save(path))
+        print(f"  {'file size':<32} {os.path.getsize(path) / 1024 / 1024:8.1f} MB")
+        loaded = timed("  load (mmap)", lambda: SegmentStore.load(path))
+        per_query("  query on mmap", lambda queries: [
+            len(loaded.between(lo, hi)) for lo, hi in queries
+        ], windows)
+        loaded.close()
+
+
+def _build_store(raw):
+    """Append every raw segment to a new store"""
+    store = SegmentStore()
+    for s, e, t in raw:
+        store.append(s, e, t)
+    return store
+
+
+if __name__ == "__main__":
+    main()
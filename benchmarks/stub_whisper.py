@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Stand-in for bin/whisper used by the load test.
+
+Accepts the whisper.cpp command line used by src/transcribe.py, sleeps for
+STUB_RTF (default 0.05) seconds per second of input audio and writes plausible
+txt/srt/vtt outputs with one segment every STUB_SEGMENT_SECONDS seconds.
+"""
+import os
+import sys
+import time
+import wave
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.subtitles import write_outputs, format_timestamp
+
+SENTENCES = [
+    "Okay, let's get started with the weekly sync.",
+    "The migration is mostly done, a couple of edge cases left.",
+    "Can you share your screen for a second?",
+    "I think we should push the release to next Tuesday.",
+    "Let's take that offline and follow up by email.",
+    "Any questions before we move on to the next item?",
+]
+
+
+def option(args, name, default=None):
+    """Return the value following a command line flag"""
+    if name in args:
+        return args[args.index(name) + 1]
+    return default
+
+
+def audio_seconds(path):
+    """Duration of the input, estimated from size for non-wav files"""
+    try:
+        with wave.open(path, "rb") as w:
+            return w.getnframes() / w.getframerate()
+    except (wave.Error, EOFError, OSError):
+        # Roughly 128 kbps for compressed input
+        return os.path.getsize(path) / 16000
+
+
+def main():
+    args = sys.argv[1:]
+    input_file = option(args, "-f")
+    if not input_file or not os.path.exists(input_file):
+        print(f"error: input file not found: {input_file}", file=sys.stderr)
+        return 2
+
+    rtf = float(os.environ.get("STUB_RTF", "0.05"))
+    segment_ms = int(float(os.environ.get("STUB_SEGMENT_SECONDS", "5")) * 1000)
+
+    if "--detect-language" in args:
+        time.sleep(min(30.0, audio_seconds(input_file)) * rtf)
+        print("whisper_full_with_state: auto-detected language: en (p = 0.970000)", file=sys.stderr)
+        return 0
+
+    total_ms = int(audio_seconds(input_file) * 1000)
+    start_ms = int(option(args, "--offset-t", 0))
+    duration_ms = int(option(args, "--duration", 0)) or total_ms - start_ms
+    end_ms = min(total_ms, start_ms + duration_ms)
+
+    time.sleep(max(0, end_ms - start_ms) / 1000 * rtf)
+
+    rng = random.Random(input_file)
+    segments = []
+    for t in range(start_ms, end_ms, segment_ms):
+        segment = {"start": t, "end": min(t + segment_ms, end_ms), "text": rng.choice(SENTENCES)}
+        segments.append(segment)
+        print(f"[{format_timestamp(t, '.')} --> {format_timestamp(segment['end'], '.')}]  {segment['text']}")
+
+    formats = [fmt for fmt in ("txt", "srt", "vtt") if f"-o{fmt}" in args]
+    output_base = option(args, "-of", os.path.splitext(input_file)[0])
+    write_outputs(segments, output_base, formats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Capacity helpers: audio duration probing, host resource checks and a history of
+real-time factors used to estimate how long a transcription will take.
+"""
+import os
+import json
+import wave
+import shutil
+import threading
+import subprocess
+
+# Seconds of processing per second of audio, used until real measurements exist
+DEFAULT_REALTIME_FACTORS = {
+    "tiny": 0.05,
+    "base": 0.08,
+    "small": 0.2,
+    "medium": 0.45,
+    "large": 0.9,
+}
+
+# Bytes per second assumed when a file's duration can't be probed (~128 kbps)
+FALLBACK_BYTES_PER_SECOND = 16000
+
+# Uncompressed formats are assumed to be CD quality (44.1 kHz stereo 16-bit)
+PCM_BYTES_PER_SECOND = 176400
+PCM_EXTENSIONS = {".wav", ".aif", ".aiff"}
+
+# Weight of the newest measurement in the moving average
+SMOOTHING = 0.3
+
+
+def probe_duration(path):
+    """Return the duration of an audio file in seconds, or None if unknown"""
+    try:
+        with wave.open(path, "rb") as w:
+            return w.getnframes() / w.getframerate()
+    except (wave.Error, EOFError, OSError):
+        pass
+
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+           "-of", "default=noprint_wrappers=1:nokey=1", path]
+    try:
+        process = subprocess.run(cmd, capture_output=True, text=True)
+        return float(process.stdout.strip())
+    except (OSError, ValueError):
+        return None
+
+
+def bytes_per_second(filename):
+    """Guess a file's audio bytes per second from its extension"""
+    if os.path.splitext(filename)[1].lower() in PCM_EXTENSIONS:
+        return PCM_BYTES_PER_SECOND
+    return FALLBACK_BYTES_PER_SECOND
+
+
+def estimate_duration(path):
+    """
+    Return the audio duration in seconds, guessing from the file size and
+    extension (see bytes_per_second) when it can't be probed
+    """
+    duration = probe_duration(path)
+    if duration is None:
+        duration = os.path.getsize(path) / bytes_per_second(path) if os.path.exists(path) else 0.0
+    return duration
+
+
+def free_memory_bytes():
+    """Return available physical memory in bytes, or None if it can't be determined"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    # macOS: free + inactive + speculative pages from vm_stat
+    try:
+        output = subprocess.run(["vm_stat"], capture_output=True, text=True).stdout
+        page_size = int(output.split("page size of ")[1].split()[0])
+        pages = 0
+        for line in output.splitlines():
+            if line.startswith(("Pages free:", "Pages inactive:", "Pages speculative:")):
+                pages += int(line.split(":")[1].strip().rstrip("."))
+        return pages * page_size
+    except (OSError, IndexError, ValueError):
+        pass
+
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def free_disk_bytes(path="."):
+    """Return free disk space for the filesystem holding path"""
+    return shutil.disk_usage(path).free
+
+
+def model_family(model):
+    """Map a model name such as "medium.en" or "large-v3" to its size family"""
+    return model.split(".")[0].split("-")[0]
+
+
+class RealtimeFactorHistory:
+    """
+    Moving average of measured real-time factors per (model, threads), persisted
+    as JSON so estimates survive restarts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.factors = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.factors = json.load(f)
+            except (OSError, ValueError):
+                self.factors = {}
+
+    @staticmethod
+    def _key(model, threads):
+        return f"{model}|{threads}"
+
+    def estimate(self, model, threads):
+        """Expected processing seconds per audio second"""
+        with self.lock:
+            factor = self.factors.get(self._key(model, threads))
+            if factor is None:
+                # Fall back to any thread count measured for this model
+                measured = [v for k, v in self.factors.items() if k.split("|")[0] == model]
+                if measured:
+                    factor = sum(measured) / len(measured)
+        if factor is None:
+            factor = DEFAULT_REALTIME_FACTORS.get(model_family(model), 1.0)
+        return factor
+
+    def record(self, model, threads, audio_seconds, elapsed_seconds):
+        """Fold a finished job's measured real-time factor into the average"""
+        if not audio_seconds or audio_seconds <= 0:
+            return
+        factor = elapsed_seconds / audio_seconds
+        key = self._key(model, threads)
+        with self.lock:
+            previous = self.factors.get(key)
+            self.factors[key] = factor if previous is None else \
+                previous + SMOOTHING * (factor - previous)
+            try:
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, "w") as f:
+                    json.dump(self.factors, f, indent=2)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"Could not save real-time factor history: {e}")
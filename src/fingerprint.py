@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Acoustic fingerprints for reusing transcripts of audio heard before.
+
+Re-exported and lightly edited recordings (a trimmed intro, a cut in the middle,
+a new container or bitrate) decode to audio that was mostly transcribed already.
+Every recording is decoded to 16kHz mono PCM and reduced to one symbol per 10ms
+frame: quiet, or whether the energy of the next 20ms window rises or falls.
+
+Runs of 32 loud frames form hash keys. Keys a new recording shares with an
+indexed one vote for a time offset between the two, each likely offset is then
+checked one-second chunk by chunk, and long runs of matching chunks become
+spans whose segments are reused with shifted timestamps.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import subprocess
+from array import array
+from operator import mul, ne
+from collections import Counter, namedtuple
+
+from src.segment_store import SegmentStore
+from src.subtitles import read_segments
+from src.capacity import model_family
+
+# Where the web app and the --reuse CLI option keep the index
+DEFAULT_INDEX_DIR = os.path.join("exports", "fingerprints")
+
+SAMPLE_RATE = 16000
+FRAME_MS = 10
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+
+# Symbols stored per frame
+FALLING, RISING, QUIET = 0, 1, 2
+
+# Windows (two frames) below roughly -50 dBFS are treated as silence
+QUIET_ENERGY = 2 * FRAME_SAMPLES * 100 ** 2
+
+# Consecutive loud frames hashed into one lookup key
+KEY_FRAMES = 32
+
+# Only every Nth key of an indexed recording is stored; queries look up every key
+INDEX_STRIDE = 4
+
+# Keys seen in more places than this (tones, music loops) don't vote
+MAX_POSTINGS = 16
+
+# Key hits needed before an offset is worth checking, and how many are checked
+MIN_VOTES = 8
+MAX_CANDIDATES = 8
+
+# Offsets checked in one-second chunks; a chunk matches below this share of differing frames.
+# Unrelated audio differs in about half its frames.
+CHUNK_FRAMES = 100
+MAX_FRAME_ERROR = 0.3
+
+# Shortest run of matching audio worth reusing
+MIN_SPAN_MS = 20000
+
+# Segments this close to the edge of a matching span are transcribed again,
+# since the cut can fall anywhere inside the chunk that stopped matching
+EDGE_MARGIN_MS = 500
+
+# Leftover gaps shorter than this between reused segments are not decoded
+MIN_GAP_MS = 500
+
+# Indexed recordings kept before the oldest are dropped
+MAX_RECORDINGS = 500
+
+# Model families from least to most accurate; transcripts are only reused for
+# requests of the same family or a smaller one
+MODEL_FAMILIES = ["tiny", "base", "small", "medium", "large"]
+
+Span = namedtuple("Span", ["recording_id", "start_ms", "end_ms", "offset_ms"])
+
+
+def model_rank(model):
+    """Position of a model's family in MODEL_FAMILIES, or -1 if unknown"""
+    family = model_family(model) if model else None
+    return MODEL_FAMILIES.index(family) if family in MODEL_FAMILIES else -1
+
+
+def transcript_language(model, language):
+    """Language a transcript is in: the given one, or English for .en models"""
+    if not language and model and model.endswith(".en"):
+        return "en"
+    return language
+
+
+class Fingerprint:
+    """
+    Per-frame symbols of one recording. Frame i covers [i * FRAME_MS, (i + 1) * FRAME_MS).
+    """
+
+    def __init__(self, symbols, duration_ms):
+        self.symbols = bytes(symbols)
+        self.duration_ms = duration_ms
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @classmethod
+    def from_energies(cls, energies):
+        """Build a fingerprint from per-frame sums of squared samples"""
+        windows = [a + b for a, b in zip(energies, energies[1:])]
+        symbols = bytes(
+            QUIET if current < QUIET_ENERGY else RISING if following > current else FALLING
+            for current, following in zip(windows, windows[1:])
+        )
+        return cls(symbols, len(energies) * FRAME_MS)
+
+    def keys(self, stride=1):
+        """Yield (frame, key) for every run of KEY_FRAMES loud frames starting on a multiple of stride"""
+        mask = (1 << KEY_FRAMES) - 1
+        key = 0
+        quiet = 0
+        symbols = self.symbols
+        for i, symbol in enumerate(symbols):
+            key = ((key << 1) | (symbol & 1)) & mask
+            quiet += symbol == QUIET
+            if i >= KEY_FRAMES:
+                quiet -= symbols[i - KEY_FRAMES] == QUIET
+            start = i - KEY_FRAMES + 1
+            if start >= 0 and not quiet and start % stride == 0:
+                yield start, key
+
+
+def fingerprint_file(path):
+    """
+    Decode a file to 16kHz mono PCM with FFmpeg and fingerprint it, or return None
+    """
+    cmd = [
+        "ffmpeg", "-hide_banner", "-nostats", "-loglevel", "error", "-i", path,
+        "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"
+    ]
+    frame_bytes = FRAME_SAMPLES * 2
+    energies = array("q")
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        print(f"Could not fingerprint {path}: {e}")
+        return None
+
+    pending = b""
+    while True:
+        data = process.stdout.read(frame_bytes * 1000)
+        if not data:
+            break
+        data = pending + data
+        usable = len(data) - len(data) % frame_bytes
+        pending = data[usable:]
+        samples = array("h", data[:usable])
+        if sys.byteorder != "little":
+            samples.byteswap()
+        for i in range(0, len(samples), FRAME_SAMPLES):
+            frame = samples[i:i + FRAME_SAMPLES]
+            energies.append(sum(map(mul, frame, frame)))
+    process.stdout.close()
+
+    if process.wait() != 0 or len(energies) < KEY_FRAMES + 2:
+        return None
+    return Fingerprint.from_energies(energies)
+
+
+def matching_runs(query, reference, offset):
+    """
+    Compare two fingerprints with reference frame = query frame + offset and
+    return the (start, end) query frame ranges where consecutive chunks match
+    """
+    lo = max(0, -offset)
+    hi = min(len(query), len(reference) - offset)
+    runs = []
+    run_start = None
+    for start in range(lo, hi, CHUNK_FRAMES):
+        end = min(start + CHUNK_FRAMES, hi)
+        errors = sum(map(ne, query.symbols[start:end], reference.symbols[start + offset:end + offset]))
+        if errors <= MAX_FRAME_ERROR * (end - start):
+            if run_start is None:
+                run_start = start
+            continue
+        if run_start is not None:
+            runs.append((run_start, start))
+            run_start = None
+    if run_start is not None:
+        runs.append((run_start, hi))
+    return runs
+
+
+def subtract(run, claimed):
+    """Parts of a (start, end) range not covered by any claimed range"""
+    pieces = [run]
+    for c_start, c_end in claimed:
+        pieces = [piece for start, end in pieces
+                  for piece in ((start, min(end, c_start)), (max(start, c_end), end))
+                  if piece[1] > piece[0]]
+    return pieces
+
+
+class FingerprintIndex:
+    """
+    Fingerprints and segments of finished transcriptions, kept on disk in one
+    directory: index.json with metadata, and per recording a .fp file of frame
+    symbols and a .segments SegmentStore. Key postings are rebuilt in memory
+    the first time the index is searched.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.recordings = {}
+        self.postings = None
+        self.fingerprints = {}
+        self.path = os.path.join(directory, "index.json")
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.recordings = json.load(f)
+            except (OSError, ValueError):
+                self.recordings = {}
+
+    def _file(self, recording_id, ext):
+        return os.path.join(self.directory, f"{recording_id}.{ext}")
+
+    def _fingerprint(self, recording_id):
+        fingerprint = self.fingerprints.get(recording_id)
+        if fingerprint is None:
+            with open(self._file(recording_id, "fp"), "rb") as f:
+                symbols = f.read()
+            fingerprint = Fingerprint(symbols, self.recordings[recording_id]["duration_ms"])
+            self.fingerprints[recording_id] = fingerprint
+        return fingerprint
+
+    def _post(self, recording_id, fingerprint):
+        for frame, key in fingerprint.keys(INDEX_STRIDE):
+            self.postings.setdefault(key, []).append((recording_id, frame))
+
+    def _load_postings(self):
+        if self.postings is not None:
+            return
+        self.postings = {}
+        for recording_id in list(self.recordings):
+            try:
+                self._post(recording_id, self._fingerprint(recording_id))
+            except OSError as e:
+                print(f"Dropping unreadable fingerprint {recording_id}: {e}")
+                del self.recordings[recording_id]
+
+    def _save(self):
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self.recordings, f, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Could not save fingerprint index: {e}")
+
+    def add(self, fingerprint, segments, source, language=None, model=None):
+        """
+        Index a finished transcription: segments ({"start", "end", "text"} dicts)
+        on the fingerprinted recording's timeline, made by model in language.
+        Returns the recording id.
+        """
+        recording_id = uuid.uuid4().hex[:16]
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            SegmentStore.from_segments(segments).save(self._file(recording_id, "segments"))
+            temp_path = f"{self._file(recording_id, 'fp')}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(fingerprint.symbols)
+            os.replace(temp_path, self._file(recording_id, "fp"))
+
+            self.recordings[recording_id] = {
+                "source": os.path.basename(source),
+                "duration_ms": fingerprint.duration_ms,
+                "language": transcript_language(model, language),
+                "model": model,
+                "indexed_at": time.time(),
+            }
+            self.fingerprints[recording_id] = fingerprint
+            if self.postings is not None:
+                self._post(recording_id, fingerprint)
+
+            if len(self.recordings) > MAX_RECORDINGS:
+                oldest = sorted(self.recordings, key=lambda r: self.recordings[r]["indexed_at"])
+                for old_id in oldest[:len(self.recordings) - MAX_RECORDINGS]:
+                    del self.recordings[old_id]
+                    self.fingerprints.pop(old_id, None)
+                    for ext in ("fp", "segments"):
+                        try:
+                            os.remove(self._file(old_id, ext))
+                        except OSError:
+                            pass
+                # Rebuilt on the next search
+                self.postings = None
+            self._save()
+        return recording_id
+
+    def add_result(self, fingerprint, result, language=None):
+        """
+        Index a transcription result dict by its SRT or VTT output and model.
+        Returns the recording id, or None if the result has no timed output.
+        """
+        outputs = result.get("outputs", {})
+        timed_file = outputs.get("srt") or outputs.get("vtt")
+        if not timed_file or not os.path.exists(timed_file):
+            return None
+        if result.get("language"):
+            language = result["language"]["code"]
+        return self.add(fingerprint, read_segments(timed_file), result["original_file"], language,
+                        model=result.get("model"))
+
+    def usable(self, model=None, language=None):
+        """
+        Ids of indexed recordings whose transcripts can stand in for one made by
+        model in language: made with the same model family or a larger one (the
+        same model for unknown families), in the same language. None for either
+        skips that check; recordings indexed without a model or language fail it.
+        """
+        rank = model_rank(model)
+        language = transcript_language(model, language)
+
+        def strong_enough(indexed_model):
+            if model is None or indexed_model == model:
+                return True
+            return rank >= 0 and model_rank(indexed_model) >= rank
+
+        with self.lock:
+            return {
+                recording_id for recording_id, info in self.recordings.items()
+                if strong_enough(info.get("model"))
+                and (language is None or info.get("language") == language)
+            }
+
+    def find_spans(self, fingerprint, recording_ids=None):
+        """
+        Non-overlapping spans of the fingerprinted recording that match indexed
+        recordings, as Span(recording_id, start_ms, end_ms, offset_ms) ordered by
+        start. The same audio sits at start_ms + offset_ms in the indexed recording.
+        recording_ids limits the search to those recordings.
+        """
+        with self.lock:
+            self._load_postings()
+            votes = Counter()
+            for frame, key in fingerprint.keys():
+                postings = self.postings.get(key)
+                if postings and len(postings) <= MAX_POSTINGS:
+                    for recording_id, indexed_frame in postings:
+                        if recording_ids is None or recording_id in recording_ids:
+                            votes[(recording_id, indexed_frame - frame)] += 1
+
+            # Neighbouring offsets are the same alignment seen through frame rounding
+            candidates = []
+            for (recording_id, offset), count in votes.most_common():
+                if count < MIN_VOTES or len(candidates) == MAX_CANDIDATES:
+                    break
+                if not any(r == recording_id and abs(o - offset) <= 2 for r, o in candidates):
+                    candidates.append((recording_id, offset))
+
+            min_frames = MIN_SPAN_MS // FRAME_MS
+            claimed = []
+            spans = []
+            for recording_id, offset in candidates:
+                reference = self._fingerprint(recording_id)
+                for run in matching_runs(fingerprint, reference, offset):
+                    for start, end in subtract(run, claimed):
+                        if end - start >= min_frames:
+                            claimed.append((start, end))
+                            spans.append(Span(recording_id, start * FRAME_MS, end * FRAME_MS,
+                                              offset * FRAME_MS))
+        return sorted(spans, key=lambda s: s.start_ms)
+
+    def plan_reuse(self, fingerprint, model=None, language=None):
+        """
+        Work out which segments of earlier transcriptions can be reused for a
+        recording transcribed with model in language (see usable). Returns None
+        if nothing can, otherwise a dict with the reused "segments" shifted onto
+        the new timeline, the "gaps" (start_ms, end_ms) left to transcribe,
+        "reused_ms", the matching "sources" and their "language".
+        """
+        spans = self.find_spans(fingerprint, self.usable(model, language))
+        segments = []
+        covered = []
+        sources = []
+        for span in spans:
+            # Only the recording's own ends are safe to reuse right up to the edge
+            lo = span.start_ms - FRAME_MS * 5 if span.start_ms == 0 else span.start_ms + EDGE_MARGIN_MS
+            at_end = span.end_ms >= len(fingerprint) * FRAME_MS
+            hi = fingerprint.duration_ms + FRAME_MS * 5 if at_end else span.end_ms - EDGE_MARGIN_MS
+            offset = span.offset_ms
+
+            with self.lock:
+                info = self.recordings.get(span.recording_id)
+                segments_path = self._file(span.recording_id, "segments")
+            if info is None:
+                continue
+            try:
+                store = SegmentStore.load(segments_path, use_mmap=False)
+            except (OSError, ValueError) as e:
+                print(f"Could not read segments of {span.recording_id}: {e}")
+                continue
+            reused = [
+                {"start": max(0, s.start - offset), "end": min(fingerprint.duration_ms, s.end - offset),
+                 "text": s.text}
+                for s in store.between(lo + offset, hi + offset)
+                if s.start >= lo + offset and s.end <= hi + offset
+            ]
+            if not reused:
+                continue
+            segments += reused
+            covered.append((reused[0]["start"], reused[-1]["end"]))
+            sources.append(dict(info, id=span.recording_id, start_ms=covered[-1][0],
+                                end_ms=covered[-1][1], offset_ms=offset))
+
+        if not covered:
+            return None
+
+        gaps = []
+        position = 0
+        for start, end in sorted(covered) + [(fingerprint.duration_ms, fingerprint.duration_ms)]:
+            if start - position >= MIN_GAP_MS:
+                gaps.append((position, start))
+            position = max(position, end)
+
+        return {
+            "segments": sorted(segments, key=lambda s: s["start"]),
+            "gaps": gaps,
+            "reused_ms": sum(end - start for start, end in covered),
+            "duration_ms": fingerprint.duration_ms,
+            "sources": sources,
+            "language": next((s["language"] for s in sources if s.get("language")), None),
+        }
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Cheap language detection pre-pass used to route "Auto Detect" jobs to the
+fastest suitable model.
+"""
+import os
+import re
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# Multilingual models tried, in order, for the detection pre-pass
+DETECTOR_MODELS = ["tiny", "base"]
+
+# Seconds of audio sampled from the start of the file
+DETECTION_SAMPLE_MS = 30000
+
+# Below this probability the detected language is not trusted for routing
+MIN_CONFIDENCE = 0.5
+
+# English-only equivalents of multilingual models. large-v3 has no .en variant,
+# medium.en is close in English accuracy and much faster.
+ENGLISH_ROUTES = {
+    "tiny": "tiny.en",
+    "base": "base.en",
+    "small": "small.en",
+    "medium": "medium.en",
+    "large": "medium.en",
+    "large-v1": "medium.en",
+    "large-v2": "medium.en",
+    "large-v3": "medium.en",
+}
+
+DETECTED_RE = re.compile(r"auto-detected language:\s*(\w+)\s*\(p\s*=\s*([\d.]+)\)")
+
+
+def find_detector_model(models_dir):
+    """Return the path of the smallest available multilingual model, or None"""
+    for name in DETECTOR_MODELS:
+        path = os.path.join(models_dir, f"ggml-{name}.bin")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def detect_language(whisper_binary, models_dir, input_file, threads=4):
+    """
+    Detect the spoken language from the first DETECTION_SAMPLE_MS of a file.
+
+    Returns {"code", "confidence", "model"} or None if detection is unavailable.
+    """
+    detector_model = find_detector_model(models_dir)
+    if not detector_model:
+        logger.warning(f"No multilingual model ({', '.join(DETECTOR_MODELS)}) found for language detection")
+        return None
+
+    cmd = [
+        whisper_binary,
+        "-m", detector_model,
+        "-f", input_file,
+        "-l", "auto",
+        "--detect-language",
+        "--duration", str(DETECTION_SAMPLE_MS),
+        "--threads", str(threads)
+    ]
+    logger.debug(f"Detecting language with command: {' '.join(cmd)}")
+
+    try:
+        process = subprocess.run(cmd, capture_output=True, text=True)
+    except Exception as e:
+        logger.warning(f"Language detection failed: {e}")
+        return None
+
+    match = DETECTED_RE.search(process.stderr) or DETECTED_RE.search(process.stdout)
+    if not match:
+        logger.warning(f"Could not detect language: {process.stderr}")
+        return None
+
+    return {
+        "code": match.group(1),
+        "confidence": float(match.group(2)),
+        "model": os.path.basename(detector_model)[len("ggml-"):-len(".bin")]
+    }
+
+
+def route_model(model, language, models_dir):
+    """
+    Pick the fastest model suited to the detected language. Falls back to the
+    requested model if the routed one is not installed.
+    """
+    if language != "en" or model.endswith(".en"):
+        return model
+    routed = ENGLISH_ROUTES.get(model)
+    if routed and os.path.exists(os.path.join(models_dir, f"ggml-{routed}.bin")):
+        return routed
+    return model
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Staged transcription pipeline for queues of files.
+
+transcribe_file runs conversion, whisper and output handling back to back, so
+the CPU-heavy whisper stage sits idle while a file is being converted or its
+outputs collected. Here each stage has its own bounded queue and worker count:
+while file N is in whisper, file N+1 is being probed and normalized and file
+N-1's outputs are being published.
+"""
+import time
+import queue
+import threading
+
+from src.transcribe import (prepare_transcription, run_transcription, finalize_transcription,
+                            cleanup_transcription, get_optimal_threads)
+
+# Items allowed to wait in front of each stage before submit() blocks
+DEFAULT_QUEUE_SIZE = 2
+
+_STOP = object()
+
+
+class Stage:
+    """A pool of worker threads running one step of the pipeline"""
+
+    def __init__(self, name, func, workers, queue_size):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.next = None
+        self.lock = threading.Lock()
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.threads = []
+        self.running = workers
+
+    def put(self, item):
+        self.queue.put(item)
+        with self.lock:
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def stats(self, elapsed):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "processed": self.processed,
+                "failed": self.failed,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "utilization": self.busy_seconds / (self.workers * elapsed) if elapsed > 0 else 0.0,
+                "avg_queue_wait": self.wait_seconds / self.processed if self.processed else 0.0,
+                "max_queue_depth": self.max_depth,
+            }
+
+
+class TranscriptionPipeline:
+    """
+    Runs files through prepare (convert, VAD, language detection), whisper and
+    finalize (remap and publish outputs) stages concurrently.
+
+    submit() blocks while the first stage's queue is full, so memory and temp
+    files stay bounded however many files are queued. on_complete(item, result)
+    is called from a finalize worker with result None for failed files.
+
+    The machine's threads are split between the whisper workers, so running
+    several at once doesn't oversubscribe the CPU. With replace, a file's
+    outputs overwrite an existing output directory instead of going next to it.
+    """
+
+    def __init__(self, model="large-v3", language=None, output_formats=["txt", "srt", "vtt"],
+                 use_coreml=True, detect_language=True, vad=False, prepare_workers=1,
+                 whisper_workers=1, finalize_workers=1, queue_size=DEFAULT_QUEUE_SIZE,
+                 on_complete=None, replace=False):
+        self.options = dict(model=model, language=language, output_formats=output_formats,
+                            use_coreml=use_coreml, detect_language=detect_language, vad=vad,
+                            replace=replace,
+                            threads=max(1, get_optimal_threads() // max(1, whisper_workers)))
+        self.on_complete = on_complete
+        self.stages = [
+            Stage("prepare", self._prepare, prepare_workers, queue_size),
+            Stage("whisper", self._whisper, whisper_workers, queue_size),
+            Stage("finalize", self._finalize, finalize_workers, queue_size),
+        ]
+        for stage, following in zip(self.stages, self.stages[1:]):
+            stage.next = following
+        self.started_at = None
+        self.finished_at = None
+
+    def _prepare(self, item):
+        item["job"] = prepare_transcription(item["file_path"], output_dir=item["output_dir"],
+                                            **self.options)
+        return item["job"] is not None
+
+    def _whisper(self, item):
+        return run_transcription(item["job"])
+
+    def _finalize(self, item):
+        item["result"] = finalize_transcription(item["job"])
+        return item["result"] is not None
+
+    def start(self):
+        self.started_at = time.time()
+        for stage in self.stages:
+            for i in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(stage,), daemon=True,
+                                          name=f"{stage.name}-{i}")
+                stage.threads.append(thread)
+                thread.start()
+        return self
+
+    def submit(self, file_path, output_dir=None, context=None):
+        """Queue a file; blocks while the prepare stage is saturated"""
+        if self.started_at is None:
+            self.start()
+        self.stages[0].put({"file_path": file_path, "output_dir": output_dir, "context": context,
+                            "job": None, "result": None, "enqueued_at": time.time()})
+
+    def _work(self, stage):
+        while True:
+            item = stage.queue.get()
+            if item is _STOP:
+                with stage.lock:
+                    stage.running -= 1
+                    last = stage.running == 0
+                # The last worker out passes shutdown on to the next stage
+                if last and stage.next:
+                    for _ in range(stage.next.workers):
+                        stage.next.put(_STOP)
+                return
+
+            started = time.time()
+            try:
+                ok = stage.func(item)
+            except Exception as e:
+                print(f"Error in {stage.name} stage for {item['file_path']}: {e}")
+                ok = False
+            finished = time.time()
+
+            with stage.lock:
+                stage.busy_seconds += finished - started
+                stage.wait_seconds += started - item["enqueued_at"]
+                stage.processed += 1
+                if not ok:
+                    stage.failed += 1
+
+            if ok and stage.next:
+                item["enqueued_at"] = finished
+                stage.next.put(item)
+                continue
+            if not ok and item["job"]:
+                cleanup_transcription(item["job"])
+            if self.on_complete:
+                try:
+                    self.on_complete(item, item["result"] if ok else None)
+                except Exception as e:
+                    print(f"Error in completion callback for {item['file_path']}: {e}")
+
+    def close(self):
+        """Wait for every submitted file to finish and stop the workers"""
+        if self.started_at is None:
+            return
+        for _ in range(self.stages[0].workers):
+            self.stages[0].put(_STOP)
+        for stage in self.stages:
+            for thread in stage.threads:
+                thread.join()
+        self.finished_at = time.time()
+
+    def report(self):
+        """Per-stage utilization; the stage closest to 1.0 is the bottleneck"""
+        if self.started_at is None:
+            return {"elapsed_seconds": 0.0, "stages": {}, "bottleneck": None}
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        stages = {stage.name: stage.stats(elapsed) for stage in self.stages}
+        bottleneck = max(stages, key=lambda name: stages[name]["utilization"])
+        return {"elapsed_seconds": round(elapsed, 3), "stages": stages, "bottleneck": bottleneck}
+
+
+def format_report(report):
+    lines = [f"Pipeline finished in {report['elapsed_seconds']:.1f}s"]
+    for name, stats in report["stages"].items():
+        lines.append(f"  {name:<9} {stats['workers']} worker(s)  {stats['processed']:>4} done  "
+                     f"{stats['failed']:>3} failed  {stats['utilization']:>6.1%} busy  "
+                     f"avg wait {stats['avg_queue_wait']:.1f}s")
+    if report["bottleneck"]:
+        lines.append(f"  Bottleneck: {report['bottleneck']}")
+    return "\n".join(lines)
+
+
+def transcribe_files(file_paths, output_dir_for=None, **options):
+    """
+    Transcribe several files through the pipeline. Returns ([result or None per
+    file, in the order given], report), so a path listed twice gets both results.
+    output_dir_for(path) picks each file's output directory.
+    """
+    results = [None] * len(file_paths)
+
+    def on_complete(item, result):
+        results[item["context"]] = result
+
+    pipeline = TranscriptionPipeline(on_complete=on_complete, **options)
+    for index, path in enumerate(file_paths):
+        pipeline.submit(path, output_dir=output_dir_for(path) if output_dir_for else None,
+                        context=index)
+    pipeline.close()
+    return results, pipeline.report()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory container for transcript segments.
+
+Instead of one dict per segment, start/end times are kept in int64 millisecond
+arrays and all segment text lives in a single UTF-8 buffer indexed by offsets.
+Optional word-level timing uses the same layout. A store can be written to a
+flat binary file and memory-mapped back without parsing.
+"""
+import os
+import sys
+import mmap
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+Segment = namedtuple("Segment", ["start", "end", "text"])
+Word = namedtuple("Word", ["start", "end", "text"])
+
+MAGIC = b"WTSEG001"
+HEADER = struct.Struct("<8sQQQQQ")  # magic, flags, segments, text bytes, words, word text bytes
+FLAG_WORDS = 1
+ITEM_SIZE = 8
+
+
+class SegmentStore:
+    """
+    Array-backed list of transcript segments ordered by start time.
+
+    Slicing by index or time returns a view that shares the parent's buffers.
+    """
+
+    def __init__(self, with_words=False):
+        self._starts = array("q")
+        self._ends = array("q")
+        self._text_offsets = array("q", [0])
+        self._text = bytearray()
+        self._with_words = with_words
+        self._word_offsets = array("q", [0]) if with_words else None
+        self._word_starts = array("q") if with_words else None
+        self._word_ends = array("q") if with_words else None
+        self._word_text_offsets = array("q", [0]) if with_words else None
+        self._word_text = bytearray() if with_words else None
+        # Running maximum of end times, built lazily for loaded stores
+        self._reach = array("q")
+        self._lo = 0
+        self._hi = 0
+        self._readonly = False
+        self._mmap = None
+
+    # Building
+
+    @classmethod
+    def from_segments(cls, segments):
+        """Build a store from an iterable of {"start", "end", "text"[, "words"]} dicts"""
+        segments = iter(segments)
+        first = next(segments, None)
+        store = cls(with_words=bool(first and first.get("words") is not None))
+        if first is not None:
+            store.append(first["start"], first["end"], first["text"], first.get("words"))
+        for s in segments:
+            store.append(s["start"], s["end"], s["text"], s.get("words"))
+        return store
+
+    @classmethod
+    def from_subtitles(cls, path):
+        """Build a store from an SRT or VTT transcript"""
+        from src.subtitles import read_segments
+        return cls.from_segments(read_segments(path))
+
+    def append(self, start, end, text, words=None):
+        """
+        Append a segment. Segments must be appended in start time order.
+
+        words is an optional sequence of (start, end, text) tuples.
+        """
+        if self._readonly:
+            raise TypeError("Cannot append to a read-only segment view")
+        if self._starts and start < self._starts[-1]:
+            raise ValueError("Segments must be appended in start time order")
+        if words is not None and not self._with_words:
+            raise ValueError("Store was created without word timing")
+
+        self._starts.append(int(start))
+        self._ends.append(int(end))
+        if self._reach is not None:
+            self._reach.append(max(int(end), self._reach[-1]) if self._reach else int(end))
+        self._text += text.encode("utf-8")
+        self._text_offsets.append(len(self._text))
+
+        if self._with_words:
+            for w_start, w_end, w_text in words or ():
+                self._word_starts.append(int(w_start))
+                self._word_ends.append(int(w_end))
+                self._word_text += w_text.encode("utf-8")
+                self._word_text_offsets.append(len(self._word_text))
+            self._word_offsets.append(len(self._word_starts))
+
+        self._hi += 1
+
+    # Access
+
+    @property
+    def has_words(self):
+        return self._with_words
+
+    def __len__(self):
+        return self._hi - self._lo
+
+    def _index(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("segment index out of range")
+        return self._lo + i
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            lo, hi, step = i.indices(len(self))
+            if step != 1:
+                raise ValueError("Segment views do not support steps")
+            return self._view(self._lo + lo, self._lo + max(lo, hi))
+        j = self._index(i)
+        return Segment(self._starts[j], self._ends[j], self._text_at(j))
+
+    def __iter__(self):
+        starts, ends, offsets, text = self._starts, self._ends, self._text_offsets, self._text
+        for j in range(self._lo, self._hi):
+            yield Segment(starts[j], ends[j],
+                          str(text[offsets[j]:offsets[j + 1]], "utf-8"))
+
+    def iter_raw(self):
+        """
+        Iterate as (start, end, memoryview) without decoding or copying text
+        """
+        starts, ends, offsets = self._starts, self._ends, self._text_offsets
+        text = memoryview(self._text)
+        for j in range(self._lo, self._hi):
+            yield starts[j], ends[j], text[offsets[j]:offsets[j + 1]]
+
+    def _text_at(self, j):
+        return str(self._text[self._text_offsets[j]:self._text_offsets[j + 1]], "utf-8")
+
+    def words(self, i):
+        """Word timings of segment i as a list of Word tuples"""
+        if not self._with_words:
+            return []
+        j = self._index(i)
+        offsets = self._word_text_offsets
+        return [
+            Word(self._word_starts[k], self._word_ends[k],
+                 str(self._word_text[offsets[k]:offsets[k + 1]], "utf-8"))
+            for k in range(self._word_offsets[j], self._word_offsets[j + 1])
+        ]
+
+    def as_dicts(self):
+        """Yield segments as dicts compatible with src.subtitles"""
+        for s in self:
+            yield {"start": s.start, "end": s.end, "text": s.text}
+
+    @property
+    def duration(self):
+        """End time of the last segment in milliseconds"""
+        return self._ends[self._hi - 1] if len(self) else 0
+
+    # Time queries
+
+    def _reach_array(self):
+        """
+        Largest end time of any segment up to each index. Lookbacks use it so a
+        long segment isn't missed behind shorter ones that end earlier.
+        """
+        if self._reach is None:
+            reach = array("q")
+            longest = None
+            for end in self._ends:
+                longest = end if longest is None or end > longest else longest
+                reach.append(longest)
+            self._reach = reach
+        return self._reach
+
+    def index_at(self, ms):
+        """Index of the latest starting segment covering ms, or None"""
+        reach = self._reach_array()
+        j = bisect_right(self._starts, ms, self._lo, self._hi) - 1
+        while j >= self._lo and reach[j] > ms:
+            if self._ends[j] > ms:
+                return j - self._lo
+            j -= 1
+        return None
+
+    def between(self, start_ms, end_ms):
+        """
+        View of every segment overlapping [start_ms, end_ms). Views are contiguous,
+        so when segments overlap it can also hold shorter ones ending before start_ms.
+        """
+        hi = bisect_left(self._starts, end_ms, self._lo, self._hi)
+        first = bisect_left(self._starts, start_ms, self._lo, hi)
+        # Segments starting before start_ms may still run into the range
+        lo = bisect_right(self._reach_array(), start_ms, self._lo, first)
+        # The reach of a view also counts segments before it
+        while lo < first and self._ends[lo] <= start_ms:
+            lo += 1
+        return self._view(lo, hi)
+
+    def _view(self, lo, hi):
+        view = object.__new__(SegmentStore)
+        view.__dict__.update(self.__dict__)
+        view._lo, view._hi = lo, hi
+        view._readonly = True
+        return view
+
+    # Binary form
+
+    def save(self, path):
+        """
+        Write the store (or view) to a flat little-endian binary file
+        """
+        lo, hi = self._lo, self._hi
+        n = hi - lo
+        text_lo, text_hi = self._text_offsets[lo], self._text_offsets[hi]
+
+        sections = [
+            self._starts[lo:hi],
+            self._ends[lo:hi],
+            array("q", (o - text_lo for o in self._text_offsets[lo:hi + 1])),
+        ]
+        word_text = b""
+        n_words = 0
+        flags = 0
+        if self._with_words:
+            flags |= FLAG_WORDS
+            w_lo, w_hi = self._word_offsets[lo], self._word_offsets[hi]
+            wt_lo, wt_hi = self._word_text_offsets[w_lo], self._word_text_offsets[w_hi]
+            n_words = w_hi - w_lo
+            sections += [
+                array("q", (o - w_lo for o in self._word_offsets[lo:hi + 1])),
+                self._word_starts[w_lo:w_hi],
+                self._word_ends[w_lo:w_hi],
+                array("q", (o - wt_lo for o in self._word_text_offsets[w_lo:w_hi + 1])),
+            ]
+            word_text = bytes(self._word_text[wt_lo:wt_hi])
+
+        text = bytes(self._text[text_lo:text_hi])
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, flags, n, len(text), n_words, len(word_text)))
+            for section in sections:
+                if sys.byteorder != "little":
+                    section = array("q", section)
+                    section.byteswap()
+                f.write(section.tobytes())
+            f.write(text)
+            f.write(word_text)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, use_mmap=True):
+        """
+        Load a store saved with save(). With use_mmap the arrays are views onto a
+        read-only memory map, so loading is O(1) and pages are read on demand.
+        The first time query scans the end times once to build its lookback index.
+        """
+        with open(path, "rb") as f:
+            if use_mmap and sys.byteorder == "little":
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+                use_mmap = False
+
+        data = memoryview(buffer)
+        magic, flags, n, text_len, n_words, word_text_len = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a segment store file")
+
+        pos = HEADER.size
+
+        def take(count):
+            nonlocal pos
+            raw = data[pos:pos + count * ITEM_SIZE]
+            pos += count * ITEM_SIZE
+            if use_mmap:
+                return raw.cast("q")
+            section = array("q")
+            section.frombytes(raw)
+            if sys.byteorder != "little":
+                section.byteswap()
+            return section
+
+        store = cls(with_words=bool(flags & FLAG_WORDS))
+        store._starts = take(n)
+        store._ends = take(n)
+        store._text_offsets = take(n + 1)
+        if store._with_words:
+            store._word_offsets = take(n + 1)
+            store._word_starts = take(n_words)
+            store._word_ends = take(n_words)
+            store._word_text_offsets = take(n_words + 1)
+        store._text = data[pos:pos + text_len]
+        pos += text_len
+        if store._with_words:
+            store._word_text = data[pos:pos + word_text_len]
+        store._reach = None
+        store._hi = n
+        store._readonly = True
+        store._mmap = buffer if use_mmap else None
+        return store
+
+    def close(self):
+        """Release the memory map of a loaded store"""
+        if self._mmap is not None:
+            for name, value in list(self.__dict__.items()):
+                if isinstance(value, memoryview):
+                    value.release()
+                    setattr(self, name, None)
+            self._mmap.close()
+            self._mmap = None
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Transcode audio to whisper's 16kHz mono wav while it is still arriving.
+"""
+import os
+import threading
+import subprocess
+from collections import deque
+
+# Containers FFmpeg can decode from a non-seekable pipe. MP4/M4A/MOV usually keep
+# their index at the end of the file and must be converted once fully received.
+STREAMABLE_EXTENSIONS = {'.mp3', '.wav', '.ogg', '.opus'}
+
+# Last lines of FFmpeg's error output kept for the failure message
+STDERR_TAIL_LINES = 20
+
+
+class StreamingTranscoder:
+    """
+    Feeds bytes to an FFmpeg process as they are received so conversion runs
+    alongside the upload instead of after it. Any failure only disables the
+    streaming path; callers fall back to converting the finished file.
+    """
+
+    def __init__(self, wav_path):
+        self.wav_path = wav_path
+        self.failed = False
+        self.process = None
+        self.errors = deque(maxlen=STDERR_TAIL_LINES)
+        self.stderr_reader = None
+        try:
+            self.process = subprocess.Popen(
+                ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+                 "-i", "pipe:0",
+                 "-ar", "16000",       # 16kHz sample rate
+                 "-ac", "1",           # mono audio
+                 "-c:a", "pcm_s16le",  # 16-bit PCM
+                 wav_path],
+                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+            )
+        except Exception as e:
+            print(f"Streaming transcode unavailable: {e}")
+            self.failed = True
+            return
+        # Drained as it comes: damaged input can log an error per frame, and a full
+        # pipe would block FFmpeg and with it every feed()
+        self.stderr_reader = threading.Thread(target=self._drain_stderr, daemon=True)
+        self.stderr_reader.start()
+
+    def _drain_stderr(self):
+        for line in self.process.stderr:
+            self.errors.append(line.decode(errors='replace'))
+
+    @classmethod
+    def supports(cls, filename):
+        return os.path.splitext(filename)[1].lower() in STREAMABLE_EXTENSIONS
+
+    def feed(self, data):
+        if self.failed:
+            return
+        try:
+            self.process.stdin.write(data)
+        except (BrokenPipeError, OSError, ValueError):
+            self.abort()
+
+    def finish(self):
+        """Close the input and wait for FFmpeg. Returns the wav path or None."""
+        if self.failed:
+            return None
+        try:
+            self.process.stdin.close()
+        except (BrokenPipeError, OSError, ValueError):
+            self.abort()
+            return None
+        self.process.wait()
+        self.stderr_reader.join()
+        if self.process.returncode != 0:
+            print(f"Streaming transcode failed: {''.join(self.errors)}")
+            self.abort()
+            return None
+        return self.wav_path
+
+    def abort(self):
+        """Stop FFmpeg and discard the partial output"""
+        self.failed = True
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        if os.path.exists(self.wav_path):
+            os.remove(self.wav_path)
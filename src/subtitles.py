@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Read and write whisper.cpp transcript formats (txt, srt, vtt).
+
+Segments are plain dicts of the form {"start": ms, "end": ms, "text": str}
+with integer millisecond timestamps.
+"""
+import os
+import re
+
+TIMESTAMP_RE = re.compile(
+    r"(\d+):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d+):(\d{2}):(\d{2})[,.](\d{3})"
+)
+
+# A segment as printed by whisper.cpp: "[00:00:00.000 --> 00:00:05.000]  text"
+SEGMENT_LINE_RE = re.compile(r"^\[" + TIMESTAMP_RE.pattern + r"\]\s*(.*)$")
+
+SUPPORTED_FORMATS = ("txt", "srt", "vtt")
+
+
+def parse_timestamp(hours, minutes, seconds, millis):
+    """Convert timestamp components to milliseconds"""
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(millis)
+
+
+def format_timestamp(ms, separator=","):
+    """Format milliseconds as HH:MM:SS,mmm (SRT) or HH:MM:SS.mmm (VTT)"""
+    ms = max(0, int(ms))
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+
+def parse_time(value):
+    """
+    Parse a user supplied time such as "90", "1:30", "01:02:03.5" into milliseconds
+    """
+    parts = str(value).strip().split(":")
+    if len(parts) > 3:
+        raise ValueError(f"Invalid time: {value}")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError(f"Invalid time: {value}")
+    return int(round(seconds * 1000))
+
+
+def read_segments(path):
+    """Read timed segments from an SRT or VTT file"""
+    segments = []
+    with open(path, "r", encoding="utf-8") as f:
+        blocks = re.split(r"\n\s*\n", f.read().replace("\r\n", "\n"))
+
+    for block in blocks:
+        lines = block.strip().split("\n")
+        for i, line in enumerate(lines):
+            match = TIMESTAMP_RE.search(line)
+            if match:
+                groups = match.groups()
+                segments.append({
+                    "start": parse_timestamp(*groups[:4]),
+                    "end": parse_timestamp(*groups[4:]),
+                    "text": " ".join(l.strip() for l in lines[i + 1:]).strip()
+                })
+                break
+
+    return segments
+
+
+def parse_segment_line(line):
+    """Parse one line of whisper.cpp console output into a segment, or None"""
+    match = SEGMENT_LINE_RE.match(line.strip())
+    if not match:
+        return None
+    groups = match.groups()
+    return {
+        "start": parse_timestamp(*groups[:4]),
+        "end": parse_timestamp(*groups[4:8]),
+        "text": groups[8].strip()
+    }
+
+
+def find_timed_output(output_dir):
+    """Return the SRT (preferred) or VTT transcript in an output directory"""
+    if not os.path.isdir(output_dir):
+        return None
+    for fmt in ("srt", "vtt"):
+        for name in sorted(os.listdir(output_dir)):
+            if name.endswith(f".{fmt}"):
+                return os.path.join(output_dir, name)
+    return None
+
+
+def render(segments, fmt):
+    """Render segments to the text of a given output format"""
+    if fmt == "txt":
+        return "".join(f"{s['text']}\n" for s in segments)
+    if fmt == "srt":
+        return "".join(
+            f"{i}\n{format_timestamp(s['start'])} --> {format_timestamp(s['end'])}\n{s['text']}\n\n"
+            for i, s in enumerate(segments, 1)
+        )
+    if fmt == "vtt":
+        return "WEBVTT\n\n" + "".join(
+            f"{format_timestamp(s['start'], '.')} --> {format_timestamp(s['end'], '.')}\n{s['text']}\n\n"
+            for s in segments
+        )
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+def write_outputs(segments, output_file_base, output_formats):
+    """
+    Write segments in every requested format, replacing existing files atomically
+    """
+    outputs = {}
+    for fmt in output_formats:
+        target = f"{output_file_base}.{fmt}"
+        temp_path = f"{target}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(render(segments, fmt))
+        os.replace(temp_path, target)
+        outputs[fmt] = target
+    return outputs
+
+
+def splice_segments(segments, replacement, start_ms, end_ms):
+    """
+    Replace every segment inside [start_ms, end_ms) with the replacement segments
+    """
+    before = [s for s in segments if s["end"] <= start_ms]
+    after = [s for s in segments if s["start"] >= end_ms]
+    middle = [s for s in replacement if s["start"] < end_ms and s["end"] > start_ms]
+    return before + middle + after
+
+
+def expand_range(segments, start_ms, end_ms):
+    """
+    Widen a time range so it never cuts an existing segment in half
+    """
+    for s in segments:
+        if s["start"] < start_ms < s["end"]:
+            start_ms = s["start"]
+        if s["start"] < end_ms < s["end"]:
+            end_ms = s["end"]
+    return start_ms, end_ms
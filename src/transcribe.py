@@ -1,13 +1,34 @@
 #!/usr/bin/env python3
 import os
 import sys
+import logging
 import subprocess
 import json
 import argparse
 import multiprocessing
 import shutil
+import tempfile
+import uuid
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.language import detect_language as detect_spoken_language, route_model, MIN_CONFIDENCE
+from src.vad import remove_silence, is_whisper_wav
+from src.subtitles import (read_segments, find_timed_output, write_outputs,
+                           splice_segments, expand_range, parse_time, SUPPORTED_FORMATS)
+from src.capacity import estimate_duration
+
+logger = logging.getLogger(__name__)
+
+# Fastest models used for the draft pass of two-pass transcription, in order of preference
+DRAFT_MODELS = ["tiny.en", "base.en"]
+
+# Per-job scratch space goes on tmpfs when it has room, otherwise the system temp dir
+TMPFS_DIR = "/dev/shm"
+
+# Bytes of 16kHz mono 16-bit PCM per second of audio
+WAV_BYTES_PER_SECOND = 32000
+
 def get_optimal_threads():
     """Get optimal number of threads for M4 Max"""
     cpu_count = multiprocessing.cpu_count()
@@ -21,101 +42,73 @@ def get_optimal_threads():
     else:
         return max(4, cpu_count)
 
-def transcribe_file(file_path, model="large-v3", language=None, task="transcribe", 
-                   output_formats=["txt", "srt", "vtt"], use_coreml=True):
+def get_models_dir(root=None):
     """
-    Transcribe an audio file using whisper.cpp
+    Get the whisper models directory relative to the project root. With root,
+    it is resolved against that directory instead of the working directory.
     """
-    # Ensure file exists
-    if not os.path.exists(file_path):
-        print(f"Error: File {file_path} not found")
-        return None
-    
-    # Get base filename without extension
-    base_name = os.path.basename(file_path)
-    name_without_ext = os.path.splitext(base_name)[0]
-    file_ext = os.path.splitext(file_path)[1].lower()
-    
-    # Create output directory with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_dir = os.path.join("exports", f"{name_without_ext}_{timestamp}")
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Save current working directory
-    original_cwd = os.getcwd()
-    
-    # Process m4a files - convert to wav first since whisper.cpp may not handle m4a well
-    input_file = file_path
-    temp_wav_path = None
-    
-    if file_ext == '.m4a':
-        print(f"Converting m4a file to wav format for compatibility")
-        temp_wav_path = os.path.join(output_dir, f"{name_without_ext}.wav")
-        ffmpeg_cmd = [
-            "ffmpeg", "-i", file_path, 
-            "-ar", "16000", # 16kHz sample rate
-            "-ac", "1",     # mono audio
-            "-c:a", "pcm_s16le", # 16-bit PCM
-            temp_wav_path
-        ]
-        
-        try:
-            print(f"Running FFmpeg conversion: {' '.join(ffmpeg_cmd)}")
-            ffmpeg_process = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
-            
-            if ffmpeg_process.returncode != 0:
-                print(f"Error converting audio: {ffmpeg_process.stderr}")
-                return None
-                
-            input_file = temp_wav_path
-            print(f"Successfully converted to {temp_wav_path}")
-        except Exception as e:
-            print(f"Failed to convert m4a: {e}")
-            return None
-    
-    # Create the full output file base path (without extension)
-    output_file_base = os.path.join(output_dir, name_without_ext)
-    
-    # Use absolute paths to avoid any directory navigation issues
-    abs_output_file_base = os.path.abspath(output_file_base)
-    abs_file_path = os.path.abspath(input_file)
-    
-    # Build command - ensure we use absolute paths relative to project root
+    # Allow overriding, e.g. to point the web app at a stub engine for load testing
+    if os.environ.get("WHISPERTRON_MODELS_DIR"):
+        return os.path.abspath(os.environ["WHISPERTRON_MODELS_DIR"])
+    if root:
+        return os.path.join(root, "models", "whisper_models")
     # Check if we're in web/ subdirectory and adjust paths accordingly
+    if os.path.basename(os.getcwd()) == 'web':
+        return os.path.abspath("../models/whisper_models")
+    return os.path.abspath("models/whisper_models")
+
+def get_whisper_binary(root=None):
+    """Get the absolute path to the whisper binary, under root if given"""
+    if os.environ.get("WHISPERTRON_WHISPER_BIN"):
+        return os.path.abspath(os.environ["WHISPERTRON_WHISPER_BIN"])
+    if root:
+        return os.path.join(root, "bin", "whisper")
     if os.path.basename(os.getcwd()) == 'web':
         # We're in the web directory, go up one level for whisper binary
-        whisper_binary = os.path.abspath("../bin/whisper")
-        model_path = os.path.abspath(f"../models/whisper_models/ggml-{model}.bin")
-    else:
-        # We're in the project root
-        whisper_binary = os.path.abspath("bin/whisper")
-        model_path = os.path.abspath(f"models/whisper_models/ggml-{model}.bin")
-    
+        return os.path.abspath("../bin/whisper")
+    # We're in the project root
+    return os.path.abspath("bin/whisper")
+
+def get_whisper_paths(model):
+    """Get absolute paths to the whisper binary and the given model"""
+    model_path = os.path.join(get_models_dir(), f"ggml-{model}.bin")
+    return get_whisper_binary(), model_path
+
+def build_whisper_command(whisper_binary, model_path, input_file, output_file_base,
+                          language=None, output_formats=["txt", "srt", "vtt"], use_coreml=True,
+                          offset_ms=None, duration_ms=None, threads=None):
+    """
+    Build the whisper.cpp command line for a transcription run
+    """
     cmd = [whisper_binary]
     
     # Add model
     cmd.extend(["-m", model_path])
     
     # Add input file
-    cmd.extend(["-f", abs_file_path])
+    cmd.extend(["-f", input_file])
     
     # Add language if specified
     if language:
         cmd.extend(["-l", language])
     
+    # Restrict decoding to a time window if requested
+    if offset_ms:
+        cmd.extend(["--offset-t", str(int(offset_ms))])
+    if duration_ms:
+        cmd.extend(["--duration", str(int(duration_ms))])
+    
     # Add output formats
     for fmt in output_formats:
         cmd.append(f"-o{fmt}")
         
     # Set output file path (without extension)
-    cmd.extend(["-of", abs_output_file_base])
+    cmd.extend(["-of", output_file_base])
     
     # Add CoreML optimization if requested
     if use_coreml:
-        if os.path.basename(os.getcwd()) == 'web':
-            coreml_model = os.path.abspath(f"../models/whisper_models/ggml-{model}-coreml.mlmodelc")
-        else:
-            coreml_model = os.path.abspath(f"models/whisper_models/ggml-{model}-coreml.mlmodelc")
+        model_name = os.path.basename(model_path)[len("ggml-"):-len(".bin")]
+        coreml_model = os.path.join(os.path.dirname(model_path), f"ggml-{model_name}-coreml.mlmodelc")
         if os.path.exists(coreml_model):
             cmd.extend(["--coreml", coreml_model])
     
@@ -125,117 +118,731 @@ def transcribe_file(file_path, model="large-v3", language=None, task="transcribe
         "--best-of", "5", 
         "--temperature", "0.0",
         "--max-len", "60",
-        f"--threads", str(get_optimal_threads())
+        f"--threads", str(threads or get_optimal_threads())
     ])
     
-    # Execute command
-    print(f"Running transcription with command: {' '.join(cmd)}")
+    return cmd
+
+def default_output_dir(file_path, exports_dir="exports"):
+    """Timestamped output directory for a file, e.g. exports/meeting_20250101_120000"""
+    name_without_ext = os.path.splitext(os.path.basename(file_path))[0]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(exports_dir, f"{name_without_ext}_{timestamp}")
+
+def make_scratch_dir(expected_bytes=0):
+    """
+    Create a private working directory for one job. WHISPERTRON_SCRATCH_DIR
+    overrides the location; otherwise tmpfs is used if it can hold expected_bytes
+    with room to spare.
+    """
+    root = os.environ.get("WHISPERTRON_SCRATCH_DIR")
+    if not root and os.path.isdir(TMPFS_DIR) and os.access(TMPFS_DIR, os.W_OK):
+        if shutil.disk_usage(TMPFS_DIR).free > 2 * expected_bytes:
+            root = TMPFS_DIR
+    if root:
+        os.makedirs(root, exist_ok=True)
+    return tempfile.mkdtemp(prefix="whispertron_", dir=root)
+
+def claim_output_dir(staging_dir, output_dir):
+    """Rename staging_dir to output_dir, or output_dir_2, _3, ... if that is taken"""
+    candidate = output_dir
+    suffix = 2
+    while True:
+        if not os.path.lexists(candidate):
+            try:
+                os.rename(staging_dir, candidate)
+                return candidate
+            except OSError:
+                # Another job published there first; anything else is a real error
+                if not os.path.lexists(candidate):
+                    raise
+        candidate = f"{output_dir}_{suffix}"
+        suffix += 1
+
+def publish_outputs(outputs, output_dir, replace=False):
+    """
+    Move finished outputs ({fmt: path}) from a scratch directory into output_dir.
+
+    Files are first collected in a hidden staging directory next to output_dir,
+    on the same filesystem, so a new output_dir appears in a single rename with
+    every file present. If output_dir already exists, the outputs go to
+    output_dir_2 (or _3, ...) unless replace is set. With replace, as for a refine
+    pass or a re-run, each existing file is replaced atomically instead.
+    Returns (final output_dir, {fmt: final path}).
+    """
+    output_dir = os.path.abspath(output_dir)
+    parent = os.path.dirname(output_dir)
+    os.makedirs(parent, exist_ok=True)
+    # Not mkdtemp: its private 0700 mode would carry over to the published directory
+    staging_dir = os.path.join(parent, f".tmp-{uuid.uuid4().hex}")
+    os.mkdir(staging_dir)
+    try:
+        names = {}
+        for fmt, path in outputs.items():
+            # A plain rename when scratch shares the filesystem, a copy from tmpfs otherwise
+            shutil.move(path, os.path.join(staging_dir, os.path.basename(path)))
+            names[fmt] = os.path.basename(path)
+        if not replace:
+            output_dir = claim_output_dir(staging_dir, output_dir)
+        else:
+            try:
+                os.rename(staging_dir, output_dir)
+            except OSError:
+                os.makedirs(output_dir, exist_ok=True)
+                for name in names.values():
+                    os.replace(os.path.join(staging_dir, name), os.path.join(output_dir, name))
+        return output_dir, {fmt: os.path.join(output_dir, name) for fmt, name in names.items()}
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+def cleanup_transcription(job):
+    """Remove a job's scratch directory; safe to call more than once"""
+    shutil.rmtree(job["scratch_dir"], ignore_errors=True)
+
+def convert_to_wav(file_path, wav_path):
+    """
+    Convert an audio file to 16kHz mono 16-bit PCM wav for whisper.cpp
+    """
+    logger.info(f"Converting {os.path.splitext(file_path)[1]} file to wav format for compatibility")
+    ffmpeg_cmd = [
+        "ffmpeg", "-i", file_path, 
+        "-ar", "16000", # 16kHz sample rate
+        "-ac", "1",     # mono audio
+        "-c:a", "pcm_s16le", # 16-bit PCM
+        wav_path
+    ]
     
-    # Ensure we have access to the whisper binary
-    if not os.path.exists(whisper_binary):
-        print(f"Error: Whisper binary not found at {whisper_binary}")
+    try:
+        logger.debug(f"Running FFmpeg conversion: {' '.join(ffmpeg_cmd)}")
+        ffmpeg_process = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
+        
+        if ffmpeg_process.returncode != 0:
+            logger.error(f"Error converting audio: {ffmpeg_process.stderr}")
+            return False
+            
+        logger.info(f"Successfully converted to {wav_path}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to convert audio: {e}")
+        return False
+
+def run_whisper(cmd, process_callback=None):
+    """
+    Run a whisper.cpp command, handing the process to process_callback once started
+    so callers can terminate it. Returns (returncode, stdout, stderr).
+    """
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if process_callback:
+        process_callback(process)
+    stdout, stderr = process.communicate()
+    return process.returncode, stdout, stderr
+
+def transcribe_file(file_path, model="large-v3", language=None, task="transcribe", 
+                   output_formats=["txt", "srt", "vtt"], use_coreml=True, detect_language=True,
+                   output_dir=None, process_callback=None, vad=False, threads=None, replace=False):
+    """
+    Transcribe an audio file using whisper.cpp
+
+    When no language is given and detect_language is set, a short pre-pass with a
+    tiny multilingual model detects the language, passes it to the main decode
+    and routes English audio to the matching .en model.
+
+    output_dir defaults to a new timestamped directory under exports/. If it
+    already exists, a numbered sibling is used unless replace is set (see
+    publish_outputs); result["output_dir"] is where the files went.
+    process_callback receives the whisper subprocess so it can be terminated.
+    With vad, silent stretches are removed before decoding and SRT/VTT
+    timestamps are mapped back onto the original recording.
+    threads caps whisper's CPU threads (default: every available core).
+
+    Runs the prepare, whisper and finalize stages back to back; src/pipeline.py
+    overlaps them across several files.
+    """
+    job = prepare_transcription(file_path, model=model, language=language,
+                                output_formats=output_formats, use_coreml=use_coreml,
+                                detect_language=detect_language, output_dir=output_dir, vad=vad,
+                                threads=threads, replace=replace)
+    if job is None:
         return None
-    
-    if not os.path.exists(model_path):
-        print(f"Error: Model not found at {model_path}")
+    if not run_transcription(job, process_callback):
+        cleanup_transcription(job)
+        return None
+    return finalize_transcription(job)
+
+def prepare_transcription(file_path, model="large-v3", language=None,
+                          output_formats=["txt", "srt", "vtt"], use_coreml=True,
+                          detect_language=True, output_dir=None, vad=False,
+                          whisper_binary=None, models_dir=None, threads=None, replace=False):
+    """
+    Probe and normalize stage of a transcription: convert the input for whisper,
+    strip silence, detect the language and build the whisper command.
+
+    whisper_binary, models_dir and threads default to bin/whisper, the models
+    directory and every available core. replace lets the outputs overwrite an
+    existing output_dir.
+
+    Intermediate audio and whisper's outputs live in a private scratch directory
+    (see make_scratch_dir) until finalize_transcription publishes them.
+
+    Returns a job dict consumed by run_transcription and finalize_transcription,
+    or None if the file can't be transcribed.
+    """
+    # Ensure file exists
+    if not os.path.exists(file_path):
+        logger.error(f"Error: File {file_path} not found")
         return None
     
-    process = subprocess.run(cmd, capture_output=True, text=True)
+    # Get base filename without extension
+    base_name = os.path.basename(file_path)
+    name_without_ext = os.path.splitext(base_name)[0]
+    file_ext = os.path.splitext(file_path)[1].lower()
+    
+    # Output directory with timestamp; created when the outputs are published
+    if output_dir is None:
+        output_dir = default_output_dir(file_path)
     
-    if process.returncode != 0:
-        print(f"Error during transcription: {process.stderr}")
-        print(f"Command that failed: {' '.join(cmd)}")
-        return None
+    # Room for a converted copy plus a condensed copy when removing silence
+    expected_bytes = estimate_duration(file_path) * WAV_BYTES_PER_SECOND * (2 if vad else 1)
+    scratch_dir = make_scratch_dir(expected_bytes)
+    try:
+        def fail():
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+            return None
+        
+        # Process m4a files - convert to wav first since whisper.cpp may not handle m4a well
+        input_file = file_path
+        temp_wav_path = None
+        
+        if file_ext == '.m4a':
+            temp_wav_path = os.path.join(scratch_dir, f"{name_without_ext}.wav")
+            if not convert_to_wav(file_path, temp_wav_path):
+                return fail()
+            input_file = temp_wav_path
+        
+        # Drop silence before decoding, keeping a map back to the original timeline
+        time_map = None
+        vad_stats = None
+        speech_wav_path = None
+        if vad:
+            if not is_whisper_wav(input_file):
+                temp_wav_path = os.path.join(scratch_dir, f"{name_without_ext}.wav")
+                if not convert_to_wav(input_file, temp_wav_path):
+                    return fail()
+                input_file = temp_wav_path
+        
+            speech_wav_path = os.path.join(scratch_dir, f"{name_without_ext}.speech.wav")
+            time_map, vad_stats = remove_silence(input_file, speech_wav_path)
+            if time_map:
+                logger.info(f"Skipping {vad_stats['skipped_seconds']:.1f}s of silence "
+                      f"({vad_stats['skipped_ratio']:.0%} of the audio)")
+                input_file = speech_wav_path
+            elif vad_stats is None:
+                logger.warning("Silence detection unavailable, transcribing the full audio")
+        
+        # whisper writes {scratch_dir}/{name}.{fmt}; absolute so the cwd never matters
+        abs_output_file_base = os.path.abspath(os.path.join(scratch_dir, name_without_ext))
+        abs_file_path = os.path.abspath(input_file)
+        
+        requested_model = model
+        whisper_binary = whisper_binary or get_whisper_binary()
+        models_dir = models_dir or get_models_dir()
+        threads = threads or get_optimal_threads()
+        model_path = os.path.join(models_dir, f"ggml-{model}.bin")
+        
+        # Detect the language up front so the main decode can skip its own detection
+        detected = None
+        if not language and detect_language and not model.endswith(".en") and os.path.exists(whisper_binary):
+            detected = detect_spoken_language(whisper_binary, models_dir, abs_file_path,
+                                              threads=threads)
+            if detected and detected["confidence"] >= MIN_CONFIDENCE:
+                logger.info(f"Detected language: {detected['code']} (p = {detected['confidence']:.2f})")
+                language = detected["code"]
+                model = route_model(model, language, models_dir)
+                if model != requested_model:
+                    logger.info(f"Routing {requested_model} to {model} for language {language}")
+                    model_path = os.path.join(models_dir, f"ggml-{model}.bin")
+        
+        cmd = build_whisper_command(whisper_binary, model_path, abs_file_path, abs_output_file_base,
+                                    language=language, output_formats=output_formats,
+                                    use_coreml=use_coreml, threads=threads)
+        
+        # Ensure we have access to the whisper binary
+        if not os.path.exists(whisper_binary):
+            logger.error(f"Error: Whisper binary not found at {whisper_binary}")
+            return fail()
+        
+        if not os.path.exists(model_path):
+            logger.error(f"Error: Model not found at {model_path}")
+            return fail()
+        
+        return {
+            "file_path": file_path,
+            "name": name_without_ext,
+            "output_dir": output_dir,
+            "replace": replace,
+            "scratch_dir": scratch_dir,
+            "output_file_base": abs_output_file_base,
+            "output_formats": output_formats,
+            "model": model,
+            "requested_model": requested_model,
+            "language": language,
+            "detected": detected,
+            "cmd": cmd,
+            "speech_wav_path": speech_wav_path,
+            "time_map": time_map,
+            "vad_stats": vad_stats,
+        }
+    except BaseException:
+        # Don't leave the scratch directory behind if a step above raises
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        raise
+
+def run_transcription(job, process_callback=None):
+    """
+    Whisper stage of a transcription prepared by prepare_transcription.
+    Returns True if whisper succeeded.
+    """
+    cmd = job["cmd"]
+    logger.debug(f"Running transcription with command: {' '.join(cmd)}")
+    
+    returncode, stdout, stderr = run_whisper(cmd, process_callback)
+    
+    speech_wav_path = job["speech_wav_path"]
+    if speech_wav_path and os.path.exists(speech_wav_path):
+        os.remove(speech_wav_path)
+    
+    if returncode != 0:
+        logger.error(f"Error during transcription: {stderr}")
+        logger.error(f"Command that failed: {' '.join(cmd)}")
+        return False
     
     # Check console output
-    print(f"STDOUT: {process.stdout}")
-    if process.stderr:
-        print(f"STDERR: {process.stderr}")
+    logger.debug(f"STDOUT: {stdout}")
+    if stderr:
+        logger.debug(f"STDERR: {stderr}")
+    return True
+
+def finalize_transcription(job):
+    """
+    Output stage of a transcription: map timestamps back onto the original
+    recording, publish the outputs into the job's output directory and remove
+    its scratch directory. Returns the result dict.
+    """
+    output_dir = job["output_dir"]
+    detected = job["detected"]
+    model = job["model"]
     
     # Return info about the transcription
     results = {
-        "original_file": file_path,
+        "original_file": job["file_path"],
         "output_dir": output_dir,
+        "model": model,
         "outputs": {}
     }
     
-    # Check for output files - they should be in the format "{output_file_base}.{fmt}"
-    for fmt in output_formats:
-        expected_file = f"{abs_output_file_base}.{fmt}"
-        
-        if os.path.exists(expected_file):
-            print(f"Found output file: {expected_file}")
-            results["outputs"][fmt] = expected_file
-        else:
-            print(f"Looking for file: {expected_file}")
-            # Sometimes whisper.cpp creates files in unexpected locations
-            # Let's check a few possibilities:
-            
-            # 1. Without the full path
-            local_file = f"{name_without_ext}.{fmt}"
-            if os.path.exists(local_file):
-                target_file = os.path.join(output_dir, f"{name_without_ext}.{fmt}")
-                shutil.copy(local_file, target_file)
-                print(f"Found file in current directory, copied to: {target_file}")
-                results["outputs"][fmt] = target_file
-                
-                # Clean up the file in the current directory
-                os.remove(local_file)
+    if detected:
+        results["language"] = dict(detected, routed_model=model,
+                                   requested_model=job["requested_model"],
+                                   used=job["language"] == detected["code"])
+    
+    try:
+        # whisper writes exactly "{output_file_base}.{fmt}" inside the job's scratch directory
+        outputs = {}
+        for fmt in job["output_formats"]:
+            expected_file = f"{job['output_file_base']}.{fmt}"
+            if os.path.exists(expected_file):
+                outputs[fmt] = expected_file
             else:
-                # 2. Try with just the output directory
-                alternate_file = f"{output_dir}.{fmt}"
-                if os.path.exists(alternate_file):
-                    target_file = os.path.join(output_dir, f"{name_without_ext}.{fmt}")
-                    shutil.move(alternate_file, target_file)
-                    print(f"Found file with alternate name, moved to: {target_file}")
-                    results["outputs"][fmt] = target_file
-                else:
-                    print(f"Could not find output file for format {fmt}")
-    
-    # Print debug info
-    print(f"Output directory: {output_dir}")
-    if os.path.exists(output_dir):
-        files = os.listdir(output_dir)
-        print(f"Files in output directory: {files}")
-    
-    # Also check current directory for any leftover files
-    current_files = [f for f in os.listdir('.') if name_without_ext in f and any(f.endswith(f'.{fmt}') for fmt in output_formats)]
-    if current_files:
-        print(f"Found files in current directory: {current_files}")
-        for file in current_files:
-            target_path = os.path.join(output_dir, file)
-            shutil.move(file, target_path)
-            fmt = file.split('.')[-1]
-            if fmt in output_formats:
-                results["outputs"][fmt] = target_path
-                print(f"Moved {file} to {target_path}")
-    
-    # Restore original working directory
-    os.chdir(original_cwd)
+                logger.warning(f"Could not find output file for format {fmt}")
+        
+        # Put timestamps back on the original timeline after silence removal
+        time_map = job["time_map"]
+        if time_map:
+            for fmt in ("srt", "vtt"):
+                if fmt in outputs:
+                    segments = time_map.remap_segments(read_segments(outputs[fmt]))
+                    write_outputs(segments, job["output_file_base"], [fmt])
+        
+        if outputs:
+            results["output_dir"], results["outputs"] = publish_outputs(outputs, output_dir,
+                                                                        replace=job["replace"])
+            logger.info(f"Output files: {', '.join(results['outputs'].values())}")
+    finally:
+        cleanup_transcription(job)
+    
+    if job["vad_stats"]:
+        results["vad"] = job["vad_stats"]
     
     return results
 
+def pick_draft_model(language=None):
+    """Pick the fastest installed model for a draft pass, or None"""
+    candidates = DRAFT_MODELS if language in (None, "en") else [m[:-len(".en")] for m in DRAFT_MODELS]
+    for name in candidates:
+        if os.path.exists(get_whisper_paths(name)[1]):
+            return name
+    return None
+
+def transcribe_draft(file_path, language=None, output_formats=["txt", "srt", "vtt"],
+                     use_coreml=True, output_dir=None, vad=False, threads=None):
+    """
+    Quickly transcribe a file with the smallest installed model so a first
+    result is available within seconds. The result is marked with tier "draft".
+    """
+    draft_model = pick_draft_model(language)
+    if not draft_model:
+        logger.warning(f"No draft model ({', '.join(DRAFT_MODELS)}) installed")
+        return None
+    
+    result = transcribe_file(file_path, model=draft_model, language=language,
+                             output_formats=output_formats, use_coreml=use_coreml,
+                             detect_language=False, output_dir=output_dir, vad=vad,
+                             threads=threads)
+    if result:
+        result["tier"] = "draft"
+    return result
+
+def refine_outputs(file_path, output_dir, model="large-v3", language=None,
+                   output_formats=["txt", "srt", "vtt"], use_coreml=True, process_callback=None,
+                   vad=False, threads=None):
+    """
+    Re-transcribe a file with the accurate model and replace the draft outputs
+    in output_dir. Each file is swapped in with an atomic rename, so readers of
+    the draft files always see either the complete draft or the complete final output.
+    """
+    result = transcribe_file(file_path, model=model, language=language,
+                             output_formats=output_formats, use_coreml=use_coreml,
+                             output_dir=output_dir, process_callback=process_callback, vad=vad,
+                             threads=threads, replace=True)
+    if not result:
+        return None
+    
+    result["tier"] = "final"
+    return result
+
+def transcribe_range(file_path, start, end, existing_dir, model="large-v3", language=None,
+                     output_formats=None, use_coreml=True, process_callback=None, threads=None):
+    """
+    Re-transcribe only [start, end) of a file and splice the result into an existing
+    transcription, regenerating every output format in existing_dir.
+
+    start and end may be milliseconds (int) or time strings such as "12:30" or "754.5".
+    process_callback and threads work as for transcribe_file.
+    """
+    if not os.path.exists(file_path):
+        logger.error(f"Error: File {file_path} not found")
+        return None
+    
+    timed_file = find_timed_output(existing_dir)
+    if not timed_file:
+        logger.error(f"Error: No SRT or VTT transcript found in {existing_dir}")
+        return None
+    
+    start_ms = start if isinstance(start, int) else parse_time(start)
+    end_ms = end if isinstance(end, int) else parse_time(end)
+    if end_ms <= start_ms:
+        logger.error(f"Error: Invalid range {start}-{end}")
+        return None
+    
+    segments = read_segments(timed_file)
+    
+    # Never cut an existing segment in half, otherwise text would be lost or duplicated
+    start_ms, end_ms = expand_range(segments, start_ms, end_ms)
+    logger.info(f"Re-transcribing {start_ms / 1000:.3f}s - {end_ms / 1000:.3f}s with {model}")
+    
+    # Regenerate whatever formats the existing transcription has
+    output_file_base = os.path.splitext(timed_file)[0]
+    if output_formats is None:
+        output_formats = [fmt for fmt in SUPPORTED_FORMATS
+                          if os.path.exists(f"{output_file_base}.{fmt}")]
+    
+    whisper_binary, model_path = get_whisper_paths(model)
+    if not os.path.exists(whisper_binary):
+        logger.error(f"Error: Whisper binary not found at {whisper_binary}")
+        return None
+    
+    if not os.path.exists(model_path):
+        logger.error(f"Error: Model not found at {model_path}")
+        return None
+    
+    work_dir = make_scratch_dir()
+    try:
+        input_file = os.path.abspath(file_path)
+        if os.path.splitext(file_path)[1].lower() == '.m4a':
+            input_file = os.path.join(work_dir, "input.wav")
+            if not convert_to_wav(file_path, input_file):
+                return None
+        
+        # whisper.cpp reports timestamps relative to the start of the file,
+        # so the segments can be spliced back without shifting
+        range_base = os.path.join(work_dir, "range")
+        cmd = build_whisper_command(whisper_binary, model_path, input_file, range_base,
+                                    language=language, output_formats=["srt"],
+                                    use_coreml=use_coreml, offset_ms=start_ms,
+                                    duration_ms=end_ms - start_ms, threads=threads)
+        logger.debug(f"Running transcription with command: {' '.join(cmd)}")
+        returncode, stdout, stderr = run_whisper(cmd, process_callback)
+        
+        if returncode != 0:
+            logger.error(f"Error during transcription: {stderr}")
+            logger.error(f"Command that failed: {' '.join(cmd)}")
+            return None
+        
+        if not os.path.exists(f"{range_base}.srt"):
+            logger.warning(f"Could not find output file for range transcription")
+            return None
+        
+        replacement = read_segments(f"{range_base}.srt")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    merged = splice_segments(segments, replacement, start_ms, end_ms)
+    replaced = len([s for s in segments if s["start"] < end_ms and s["end"] > start_ms])
+    outputs = write_outputs(merged, output_file_base, output_formats)
+    
+    return {
+        "original_file": file_path,
+        "output_dir": existing_dir,
+        "outputs": outputs,
+        "range": {
+            "start_ms": start_ms,
+            "end_ms": end_ms,
+            "model": model,
+            "segments_replaced": replaced,
+            "segments_added": len(merged) - (len(segments) - replaced)
+        }
+    }
+
+def transcribe_with_reuse(file_path, reuse, model="large-v3", language=None,
+                          output_formats=["txt", "srt", "vtt"], use_coreml=True, output_dir=None,
+                          process_callback=None, replace=False, threads=None):
+    """
+    Transcribe a recording that partly matches earlier transcriptions. reuse is a
+    plan from FingerprintIndex.plan_reuse (src/fingerprint.py): segments already on
+    this recording's timeline plus the gaps between them. Only the gaps are
+    decoded, with the same time windows as transcribe_range, and spliced in.
+
+    The language of the matched recordings is used when none is given.
+    output_dir, replace, process_callback and threads behave as for transcribe_file.
+    """
+    if not os.path.exists(file_path):
+        logger.error(f"Error: File {file_path} not found")
+        return None
+
+    language = language or reuse.get("language")
+    whisper_binary, model_path = get_whisper_paths(model)
+    if reuse["gaps"]:
+        if not os.path.exists(whisper_binary):
+            logger.error(f"Error: Whisper binary not found at {whisper_binary}")
+            return None
+
+        if not os.path.exists(model_path):
+            logger.error(f"Error: Model not found at {model_path}")
+            return None
+
+    if output_dir is None:
+        output_dir = default_output_dir(file_path)
+    name_without_ext = os.path.splitext(os.path.basename(file_path))[0]
+
+    segments = list(reuse["segments"])
+    work_dir = make_scratch_dir(estimate_duration(file_path) * WAV_BYTES_PER_SECOND)
+    try:
+        input_file = os.path.abspath(file_path)
+        if reuse["gaps"] and os.path.splitext(file_path)[1].lower() == '.m4a':
+            input_file = os.path.join(work_dir, "input.wav")
+            if not convert_to_wav(file_path, input_file):
+                return None
+
+        for i, (start_ms, end_ms) in enumerate(reuse["gaps"]):
+            logger.info(f"Transcribing new audio {start_ms / 1000:.3f}s - {end_ms / 1000:.3f}s with {model}")
+            gap_base = os.path.join(work_dir, f"gap{i}")
+            cmd = build_whisper_command(whisper_binary, model_path, input_file, gap_base,
+                                        language=language, output_formats=["srt"],
+                                        use_coreml=use_coreml, offset_ms=start_ms,
+                                        duration_ms=end_ms - start_ms, threads=threads)
+            returncode, stdout, stderr = run_whisper(cmd, process_callback)
+
+            if returncode != 0:
+                logger.error(f"Error during transcription: {stderr}")
+                logger.error(f"Command that failed: {' '.join(cmd)}")
+                return None
+
+            if not os.path.exists(f"{gap_base}.srt"):
+                logger.warning(f"Could not find output file for gap transcription")
+                return None
+
+            # Keep the new text from running over the reused segment after the gap
+            replacement = [dict(s, end=min(s["end"], end_ms)) for s in read_segments(f"{gap_base}.srt")]
+            segments = splice_segments(segments, replacement, start_ms, end_ms)
+
+        outputs = write_outputs(segments, os.path.join(work_dir, name_without_ext), output_formats)
+        output_dir, published = publish_outputs(outputs, output_dir, replace=replace)
+        logger.info(f"Output files: {', '.join(published.values())}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    transcribed_ms = sum(end - start for start, end in reuse["gaps"])
+    return {
+        "original_file": file_path,
+        "output_dir": output_dir,
+        "model": model,
+        "outputs": published,
+        "reuse": {
+            "reused_seconds": reuse["reused_ms"] / 1000,
+            "transcribed_seconds": transcribed_ms / 1000,
+            "total_seconds": reuse["duration_ms"] / 1000,
+            "reused_ratio": reuse["reused_ms"] / reuse["duration_ms"] if reuse["duration_ms"] else 0.0,
+            "sources": [{"source": s["source"], "start_ms": s["start_ms"], "end_ms": s["end_ms"],
+                         "offset_ms": s["offset_ms"]} for s in reuse["sources"]],
+        }
+    }
+
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     parser = argparse.ArgumentParser(description="Transcribe audio files using Whisper")
-    parser.add_argument("file", help="Audio file to transcribe")
+    parser.add_argument("files", nargs="+", metavar="file",
+                        help="Audio file(s) to transcribe; several files run as an overlapping pipeline")
     parser.add_argument("--model", default="large-v3", help="Model to use (tiny.en, base.en, small.en, medium.en, large-v3)")
     parser.add_argument("--language", help="Language code (en, fr, etc.)")
-    parser.add_argument("--formats", default="txt,srt,vtt", help="Output formats (comma-separated)")
+    parser.add_argument("--formats", help="Output formats (comma-separated, default: txt,srt,vtt)")
     parser.add_argument("--no-coreml", action="store_true", help="Disable CoreML acceleration")
+    parser.add_argument("--no-detect", action="store_true",
+                        help="Skip the language detection pre-pass when no language is given")
+    parser.add_argument("--vad", action="store_true",
+                        help="Skip silent stretches before decoding (timestamps still match the original)")
+    parser.add_argument("--two-pass", action="store_true",
+                        help="Write a fast draft first, then replace it with the chosen model's output")
+    parser.add_argument("--range", help="Only re-transcribe START-END (e.g. 12:30-13:00) of the file")
+    parser.add_argument("--existing", help="Output directory of a previous transcription to splice --range into")
+    parser.add_argument("--reuse", action="store_true",
+                        help="Reuse earlier transcripts of matching audio and only transcribe what is new")
+    parser.add_argument("--prepare-workers", type=int, default=1,
+                        help="Files converted/probed in parallel when transcribing several files")
+    parser.add_argument("--whisper-workers", type=int, default=1,
+                        help="Whisper processes run in parallel when transcribing several files")
     
     args = parser.parse_args()
     
-    formats = args.formats.split(",")
-    result = transcribe_file(
-        args.file, 
-        model=args.model,
-        language=args.language,
-        output_formats=formats,
-        use_coreml=not args.no_coreml
-    )
+    if len(args.files) > 1 and (args.range or args.two_pass or args.reuse):
+        parser.error("--range, --two-pass and --reuse take a single file")
+    if args.reuse and (args.range or args.two_pass):
+        parser.error("--reuse can't be combined with --range or --two-pass")
+    args.file = args.files[0]
+    
+    if args.range:
+        if not args.existing:
+            parser.error("--range requires --existing")
+        try:
+            start, end = args.range.split("-", 1)
+            start_ms, end_ms = parse_time(start), parse_time(end)
+        except ValueError:
+            parser.error(f"Invalid --range: {args.range}")
+        
+        result = transcribe_range(
+            args.file,
+            start_ms,
+            end_ms,
+            args.existing,
+            model=args.model,
+            language=args.language,
+            output_formats=args.formats.split(",") if args.formats else None,
+            use_coreml=not args.no_coreml
+        )
+        if result:
+            print(f"Range transcription complete!")
+            for fmt, path in result["outputs"].items():
+                print(f"- {fmt.upper()}: {path}")
+        return
+    
+    formats = (args.formats or "txt,srt,vtt").split(",")
+    
+    if args.two_pass:
+        draft = transcribe_draft(args.file, language=args.language, output_formats=formats,
+                                 use_coreml=not args.no_coreml, vad=args.vad)
+        if draft:
+            print(f"Draft ready ({draft['model']})!")
+            for fmt, path in draft["outputs"].items():
+                print(f"- {fmt.upper()}: {path}")
+            result = refine_outputs(args.file, draft["output_dir"], model=args.model,
+                                    language=args.language, output_formats=formats,
+                                    use_coreml=not args.no_coreml, vad=args.vad)
+            if result:
+                print(f"Transcription complete! Draft replaced with {result['model']} output")
+                for fmt, path in result["outputs"].items():
+                    print(f"- {fmt.upper()}: {path}")
+            return
+        print("Draft pass failed, running full transcription")
+    
+    if len(args.files) > 1:
+        # Imported here because the pipeline module builds on this one
+        from src.pipeline import transcribe_files, format_report
+        results, report = transcribe_files(
+            args.files,
+            model=args.model,
+            language=args.language,
+            output_formats=formats,
+            use_coreml=not args.no_coreml,
+            detect_language=not args.no_detect,
+            vad=args.vad,
+            prepare_workers=max(1, args.prepare_workers),
+            whisper_workers=max(1, args.whisper_workers)
+        )
+        for path, result in zip(args.files, results):
+            if result:
+                print(f"{path}: {', '.join(result['outputs'].values())}")
+            else:
+                print(f"{path}: failed")
+        print(format_report(report))
+        return
+    
+    fingerprint = None
+    reuse = None
+    if args.reuse:
+        # Imported here because the fingerprint module is only needed for --reuse
+        from src.fingerprint import FingerprintIndex, fingerprint_file, DEFAULT_INDEX_DIR
+        index = FingerprintIndex(DEFAULT_INDEX_DIR)
+        fingerprint = fingerprint_file(args.file)
+        if fingerprint:
+            reuse = index.plan_reuse(fingerprint, model=args.model, language=args.language)
+        else:
+            print("Could not fingerprint the audio, transcribing it in full")
+    
+    if reuse:
+        result = transcribe_with_reuse(
+            args.file,
+            reuse,
+            model=args.model,
+            language=args.language,
+            output_formats=formats,
+            use_coreml=not args.no_coreml
+        )
+    else:
+        result = transcribe_file(
+            args.file, 
+            model=args.model,
+            language=args.language,
+            output_formats=formats,
+            use_coreml=not args.no_coreml,
+            detect_language=not args.no_detect,
+            vad=args.vad
+        )
+    
+    # A recording reused in full adds nothing new to the index
+    if result and fingerprint and (not reuse or reuse["gaps"]):
+        index.add_result(fingerprint, result, language=args.language or (reuse or {}).get("language"))
     
     if result:
         print(f"Transcription complete!")
+        if "reuse" in result:
+            print(f"Reused: {result['reuse']['reused_seconds']:.1f}s of {result['reuse']['total_seconds']:.1f}s "
+                  f"({result['reuse']['reused_ratio']:.0%}) from "
+                  f"{', '.join(sorted({s['source'] for s in result['reuse']['sources']}))}")
+        if "language" in result:
+            print(f"Language: {result['language']['code']} "
+                  f"(p = {result['language']['confidence']:.2f}, model {result['model']})")
+        if "vad" in result:
+            print(f"Silence skipped: {result['vad']['skipped_seconds']:.1f}s "
+                  f"of {result['vad']['total_seconds']:.1f}s ({result['vad']['skipped_ratio']:.0%})")
         for fmt, path in result["outputs"].items():
             print(f"- {fmt.upper()}: {path}")
 
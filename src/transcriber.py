@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Async Python API for embedding transcription in other applications.
+
+    transcriber = Transcriber(models_dir="models/whisper_models", threads=8, max_concurrent=2)
+
+    async with transcriber.transcribe("meeting.m4a", model="medium.en") as transcription:
+        async for segment in transcription:
+            print(segment.start, segment.end, segment.text)
+        result = await transcription
+
+Segments are parsed from whisper's console output as they are decoded. Cancelling
+the task kills the whisper process, and so does leaving the async with block
+(or calling aclose()) before it finishes, which is how to stop after breaking
+out of the loop. Whisper runs as an asyncio subprocess; only the short
+conversion and output steps use the loop's default executor.
+
+Nothing is printed: progress and errors go to the src.transcribe, src.language
+and src.vad loggers.
+"""
+import os
+import time
+import asyncio
+import functools
+import threading
+from collections import deque
+
+from src.segment_store import Segment
+from src.subtitles import parse_segment_line
+from src.capacity import probe_duration
+from src.transcribe import (prepare_transcription, finalize_transcription, cleanup_transcription,
+                            default_output_dir, get_whisper_binary, get_models_dir, get_optimal_threads)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TranscriptionError(Exception):
+    """Raised when a file could not be transcribed"""
+
+
+class TranscriptionSlots:
+    """
+    Counts running transcriptions across threads and event loops. A queued
+    transcription waits on a future of its own loop, and the release that frees
+    a slot hands it straight to the longest waiter, so waiting takes neither a
+    thread nor polling.
+    """
+
+    def __init__(self, limit):
+        self.free = threading.BoundedSemaphore(limit)
+        self.lock = threading.Lock()
+        self.waiters = deque()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if not self.waiters and self.free.acquire(blocking=False):
+                return
+            future = loop.create_future()
+            self.waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self.lock:
+                handed_over = (loop, future) not in self.waiters
+                if not handed_over:
+                    self.waiters.remove((loop, future))
+            # A slot released to us just as we were cancelled goes to the next waiter
+            if handed_over:
+                self.release()
+            raise
+
+    def release(self):
+        with self.lock:
+            while self.waiters:
+                loop, future = self.waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._wake, future)
+                    return
+                except RuntimeError:
+                    # That waiter's loop has closed
+                    continue
+            self.free.release()
+
+    @staticmethod
+    def _wake(future):
+        if not future.done():
+            future.set_result(None)
+
+
+class Transcriber:
+    """
+    Holds the engine configuration shared by every transcription: whisper binary,
+    models directory, where outputs go and the CPU thread budget.
+
+    At most max_concurrent transcriptions run at once, across every thread and
+    event loop using this transcriber, and the thread budget is split evenly
+    between them. Others wait for a slot when awaited or iterated.
+    """
+
+    def __init__(self, whisper_binary=None, models_dir=None, exports_dir=None, threads=None,
+                 max_concurrent=1, use_coreml=True):
+        # Resolve everything now so later calls don't depend on the working directory
+        self.whisper_binary = os.path.abspath(whisper_binary or get_whisper_binary(PROJECT_ROOT))
+        self.models_dir = os.path.abspath(models_dir or get_models_dir(PROJECT_ROOT))
+        self.exports_dir = os.path.abspath(exports_dir or os.path.join(PROJECT_ROOT, "exports"))
+        self.threads = threads or get_optimal_threads()
+        self.max_concurrent = max(1, max_concurrent)
+        self.use_coreml = use_coreml
+        # Shared by every loop, since transcribe_sync callers each run their own
+        self.slots = TranscriptionSlots(self.max_concurrent)
+
+    @property
+    def threads_per_job(self):
+        return max(1, self.threads // self.max_concurrent)
+
+    def transcribe(self, file_path, model="large-v3", language=None,
+                   output_formats=["txt", "srt", "vtt"], output_dir=None, detect_language=True,
+                   vad=False, use_coreml=None):
+        """
+        Start transcribing a file. Iterate the returned Transcription for segments
+        as they are decoded and await it for the result dict (as returned by
+        transcribe_file, plus "timing"). use_coreml overrides the default for this file.
+        """
+        return Transcription(self, file_path, dict(
+            model=model, language=language, output_formats=output_formats,
+            output_dir=output_dir or default_output_dir(file_path, self.exports_dir),
+            detect_language=detect_language, vad=vad,
+            use_coreml=self.use_coreml if use_coreml is None else use_coreml))
+
+    def transcribe_sync(self, file_path, on_segment=None, **options):
+        """
+        Blocking wrapper for threaded callers such as the web and desktop apps.
+        on_segment(segment) is called for each segment as it is decoded.
+        """
+        async def run():
+            async with self.transcribe(file_path, **options) as transcription:
+                async for segment in transcription:
+                    if on_segment:
+                        on_segment(segment)
+                return await transcription
+
+        return asyncio.run(run())
+
+
+class Transcription:
+    """
+    One file being transcribed. Async-iterate it once for Segment(start, end, text)
+    tuples in milliseconds on the original recording's timeline, and await it
+    for the final result. Use it as an async context manager, or call aclose(),
+    so whisper is stopped if the caller stops early.
+    """
+
+    def __init__(self, transcriber, file_path, options):
+        self.transcriber = transcriber
+        self.file_path = file_path
+        self.options = options
+        self.segments = []
+        self.timing = {}
+        self._result = None
+        self._stream = None
+
+    def __aiter__(self):
+        if self._stream is not None:
+            raise RuntimeError("A transcription can only be iterated once")
+        self._stream = self._run()
+        return self._stream
+
+    def __await__(self):
+        return self.result().__await__()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """Stop whisper and discard the scratch files if still running"""
+        if self._stream is not None:
+            await self._stream.aclose()
+
+    async def result(self):
+        """Run to completion (if not iterated already) and return the result dict"""
+        if self._stream is None:
+            async for _ in self:
+                pass
+        elif self._result is None:
+            # Drain whatever the caller didn't consume
+            async for _ in self._stream:
+                pass
+        if self._result is None:
+            raise TranscriptionError(f"Transcription of {self.file_path} did not finish")
+        return self._result
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        transcriber = self.transcriber
+        submitted = time.perf_counter()
+
+        await transcriber.slots.acquire()
+        try:
+            started = time.perf_counter()
+            prepare = functools.partial(
+                prepare_transcription, self.file_path,
+                whisper_binary=transcriber.whisper_binary, models_dir=transcriber.models_dir,
+                threads=transcriber.threads_per_job, **self.options)
+            preparing = loop.run_in_executor(None, prepare)
+            try:
+                job = await asyncio.shield(preparing)
+            except asyncio.CancelledError:
+                # The worker thread can't be interrupted; drop its scratch dir when it's done
+                preparing.add_done_callback(
+                    lambda f: f.exception() is None and f.result() and cleanup_transcription(f.result()))
+                raise
+            if job is None:
+                raise TranscriptionError(f"Could not prepare {self.file_path} for transcription")
+            prepared = time.perf_counter()
+
+            first_segment = None
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *job["cmd"], stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+                stderr_reader = asyncio.ensure_future(process.stderr.read())
+                try:
+                    async for line in process.stdout:
+                        segment = parse_segment_line(line.decode("utf-8", errors="replace"))
+                        if not segment:
+                            continue
+                        if job["time_map"]:
+                            segment = job["time_map"].remap_segments([segment])[0]
+                        segment = Segment(segment["start"], segment["end"], segment["text"])
+                        if first_segment is None:
+                            first_segment = time.perf_counter()
+                        self.segments.append(segment)
+                        yield segment
+                    returncode = await process.wait()
+                    stderr = (await stderr_reader).decode("utf-8", errors="replace")
+                finally:
+                    # Cancelled or abandoned mid-stream: don't leave whisper running
+                    if process.returncode is None:
+                        process.kill()
+                        await process.wait()
+                    stderr_reader.cancel()
+
+                if returncode != 0:
+                    raise TranscriptionError(f"whisper exited with code {returncode}: {stderr.strip()}")
+            except BaseException:
+                cleanup_transcription(job)
+                raise
+            transcribed = time.perf_counter()
+
+            # Publishes the outputs and removes the scratch directory
+            result = await loop.run_in_executor(None, finalize_transcription, job)
+            finished = time.perf_counter()
+        finally:
+            transcriber.slots.release()
+
+        audio_seconds = await loop.run_in_executor(None, probe_duration, self.file_path)
+        if audio_seconds is None:
+            audio_seconds = self.segments[-1].end / 1000 if self.segments else 0.0
+        self.timing = {
+            "queued_seconds": started - submitted,
+            "prepare_seconds": prepared - started,
+            "whisper_seconds": transcribed - prepared,
+            "finalize_seconds": finished - transcribed,
+            "total_seconds": finished - submitted,
+            "first_segment_seconds": first_segment - started if first_segment else None,
+            "audio_seconds": audio_seconds,
+            "realtime_factor": (finished - started) / audio_seconds if audio_seconds else None,
+            "threads": transcriber.threads_per_job,
+        }
+        result["timing"] = self.timing
+        self._result = result
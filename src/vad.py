@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Energy-based voice activity detection used to drop silence before decoding.
+
+Silence is found with FFmpeg's silencedetect filter, the remaining speech spans
+are concatenated into a shorter wav, and a time map translates timestamps in
+the condensed audio back to the original file.
+"""
+import re
+import wave
+import logging
+import subprocess
+from bisect import bisect_left, bisect_right
+
+logger = logging.getLogger(__name__)
+
+# Audio quieter than this is treated as silence
+NOISE_THRESHOLD_DB = -35
+
+# Only silences at least this long are removed
+MIN_SILENCE_MS = 1000
+
+# Speech kept on either side of every removed silence
+PADDING_MS = 250
+
+SILENCE_START_RE = re.compile(r"silence_start:\s*(-?[\d.]+)")
+SILENCE_END_RE = re.compile(r"silence_end:\s*([\d.]+)")
+
+
+class TimeMap:
+    """
+    Maps times in condensed audio back to the original recording.
+
+    spans is a list of (original_start_ms, original_end_ms) speech spans in order.
+    """
+
+    def __init__(self, spans):
+        self.spans = spans
+        self.condensed_starts = []
+        position = 0
+        for start, end in spans:
+            self.condensed_starts.append(position)
+            position += end - start
+        self.condensed_duration = position
+
+    def to_original(self, ms, is_end=False):
+        """
+        Translate a condensed timestamp to the original timeline. End timestamps
+        that fall exactly on a cut stay with the span before it.
+        """
+        if not self.spans:
+            return ms
+        if is_end:
+            i = max(0, bisect_left(self.condensed_starts, ms) - 1)
+        else:
+            i = max(0, bisect_right(self.condensed_starts, ms) - 1)
+        start, end = self.spans[i]
+        return min(start + ms - self.condensed_starts[i], end)
+
+    def remap_segments(self, segments):
+        """Return copies of segments with timestamps on the original timeline"""
+        return [
+            dict(s, start=self.to_original(s["start"]), end=self.to_original(s["end"], is_end=True))
+            for s in segments
+        ]
+
+
+def is_whisper_wav(path):
+    """Check whether a file is already 16kHz mono 16-bit PCM wav"""
+    try:
+        with wave.open(path, "rb") as w:
+            return w.getframerate() == 16000 and w.getnchannels() == 1 and w.getsampwidth() == 2
+    except (wave.Error, EOFError, OSError):
+        return False
+
+
+def detect_silence(wav_path, noise_db=NOISE_THRESHOLD_DB, min_silence_ms=MIN_SILENCE_MS):
+    """
+    Return a list of (start_ms, end_ms) silences found by FFmpeg, or None on failure
+    """
+    cmd = [
+        "ffmpeg", "-hide_banner", "-nostats", "-i", wav_path,
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence_ms / 1000}",
+        "-f", "null", "-"
+    ]
+    try:
+        process = subprocess.run(cmd, capture_output=True, text=True)
+    except Exception as e:
+        logger.warning(f"Silence detection failed: {e}")
+        return None
+
+    if process.returncode != 0:
+        logger.warning(f"Silence detection failed: {process.stderr}")
+        return None
+
+    silences = []
+    start = None
+    for line in process.stderr.splitlines():
+        match = SILENCE_START_RE.search(line)
+        if match:
+            start = max(0, int(float(match.group(1)) * 1000))
+            continue
+        match = SILENCE_END_RE.search(line)
+        if match and start is not None:
+            silences.append((start, int(float(match.group(1)) * 1000)))
+            start = None
+
+    # A trailing silence has a start but no end
+    if start is not None:
+        silences.append((start, None))
+    return silences
+
+
+def speech_spans(silences, duration_ms, padding_ms=PADDING_MS):
+    """Turn silences into padded, merged speech spans covering the rest of the file"""
+    spans = []
+    position = 0
+    for start, end in silences:
+        end = duration_ms if end is None else min(end, duration_ms)
+        # Only keep a span if there is speech between the previous silence and this one
+        if start > position:
+            spans.append((position, min(start + padding_ms, duration_ms)))
+        # A silence running to the end of the file needs no padding after it
+        position = max(position, end if end >= duration_ms else end - padding_ms)
+    if position < duration_ms:
+        spans.append((position, duration_ms))
+
+    merged = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def condense(wav_path, spans, output_path):
+    """Write only the given spans of a wav file to output_path"""
+    with wave.open(wav_path, "rb") as source, wave.open(output_path, "wb") as target:
+        target.setparams(source.getparams())
+        rate = source.getframerate()
+        for start, end in spans:
+            first = start * rate // 1000
+            source.setpos(first)
+            target.writeframes(source.readframes(end * rate // 1000 - first))
+
+
+def remove_silence(wav_path, output_path, noise_db=NOISE_THRESHOLD_DB,
+                   min_silence_ms=MIN_SILENCE_MS, padding_ms=PADDING_MS):
+    """
+    Drop silence from a 16kHz wav. Returns (time_map, stats) where time_map is
+    None if nothing was removed (output_path is then not written), or
+    (None, None) if detection failed.
+    """
+    with wave.open(wav_path, "rb") as w:
+        duration_ms = w.getnframes() * 1000 // w.getframerate()
+
+    silences = detect_silence(wav_path, noise_db, min_silence_ms)
+    if silences is None:
+        return None, None
+
+    spans = speech_spans(silences, duration_ms, padding_ms)
+    if not spans:
+        # Everything is below the threshold, most likely a very quiet recording
+        logger.warning("No speech found above the silence threshold, keeping the full audio")
+        spans = [(0, duration_ms)]
+    time_map = TimeMap(spans)
+    skipped_ms = duration_ms - time_map.condensed_duration
+    stats = {
+        "total_seconds": duration_ms / 1000,
+        "speech_seconds": time_map.condensed_duration / 1000,
+        "skipped_seconds": skipped_ms / 1000,
+        "skipped_ratio": skipped_ms / duration_ms if duration_ms else 0.0,
+        "spans": len(spans)
+    }
+
+    if skipped_ms <= 0:
+        return None, stats
+
+    condense(wav_path, spans, output_path)
+    return time_map, stats
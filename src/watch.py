@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Watch folders for new recordings and transcribe them as they land.
+
+Files are picked up with inotify/FSEvents through watchdog when it is installed,
+otherwise by polling. A file is only submitted once its size and mtime have
+stopped changing, identical recordings are transcribed once (by content hash),
+and a state file lets restarts skip finished files and catch up on anything
+that arrived while the daemon was down. Outputs go to a tree mirroring the
+watched folders.
+"""
+import os
+import sys
+import json
+import logging
+import time
+import queue
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.pipeline import TranscriptionPipeline, format_report
+
+AUDIO_EXTENSIONS = {'.mp3', '.wav', '.m4a', '.mp4', '.mov', '.ogg', '.opus'}
+
+# Suffixes used by sync clients and browsers for files still being written
+PARTIAL_SUFFIXES = ('.part', '.partial', '.crdownload', '.download', '.tmp')
+
+# Seconds a file's size and mtime must stay unchanged before it is submitted
+SETTLE_SECONDS = 5
+
+# Seconds between full rescans when watchdog is unavailable
+POLL_INTERVAL = 10
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """Content hash used to recognise the same recording under another name"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_candidate(path):
+    name = os.path.basename(path)
+    if name.startswith(".") or name.lower().endswith(PARTIAL_SUFFIXES):
+        return False
+    return os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+
+
+class WatchState:
+    """
+    Persistent record of processed files, keyed by path (with the size and mtime
+    that were transcribed) and by content hash (with the outputs produced).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.files = {}
+        self.hashes = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                self.files = data.get("files", {})
+                self.hashes = data.get("hashes", {})
+            except (OSError, ValueError) as e:
+                print(f"Could not read watch state {path}, starting fresh: {e}")
+
+    def is_current(self, path, size, mtime):
+        """Whether this exact version of the file was already handled"""
+        with self.lock:
+            entry = self.files.get(path)
+        return entry is not None and entry["size"] == size and entry["mtime"] == mtime
+
+    def outputs_for(self, sha256):
+        with self.lock:
+            entry = self.hashes.get(sha256)
+        return entry["outputs"] if entry else None
+
+    def record(self, path, size, mtime, sha256, status, outputs=None, error=None):
+        with self.lock:
+            self.files[path] = {
+                "size": size,
+                "mtime": mtime,
+                "sha256": sha256,
+                "status": status,
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            if error:
+                self.files[path]["error"] = error
+            if status == "completed":
+                self.hashes[sha256] = {"source": path, "outputs": outputs}
+            self._save()
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"files": self.files, "hashes": self.hashes}, f, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Could not save watch state: {e}")
+
+
+class ChangeHandler(FileSystemEventHandler):
+    """Forwards created/modified/moved paths from watchdog to the daemon"""
+
+    def __init__(self, daemon):
+        self.daemon = daemon
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.daemon.notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.daemon.notify(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.daemon.notify(event.dest_path)
+
+
+class WatchDaemon:
+    """
+    Debounces file events, deduplicates by hash and feeds settled files to a
+    transcription pipeline in batches.
+    """
+
+    def __init__(self, folders, output_root, state_path, model="large-v3", language=None,
+                 output_formats=["txt", "srt", "vtt"], use_coreml=True, vad=False,
+                 workers=1, batch_size=8, batch_window=10, settle_seconds=SETTLE_SECONDS,
+                 poll_interval=POLL_INTERVAL, use_polling=False):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.output_root = os.path.abspath(output_root)
+        self.state = WatchState(state_path)
+        self.model = model
+        self.language = language
+        self.output_formats = output_formats
+        self.use_coreml = use_coreml
+        self.vad = vad
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.use_polling = use_polling or Observer is None
+
+        self.events = queue.Queue()
+        # path -> (size, mtime, time the pair was first seen)
+        self.pending = {}
+        self.ready = []
+        self.ready_since = None
+        # Hashes and paths submitted but not finished, so duplicates wait for the first copy
+        self.in_flight = set()
+        self.in_flight_paths = set()
+        # In-flight paths that changed again; looked at once their run finishes
+        self.dirty_paths = set()
+        self.in_flight_lock = threading.Lock()
+        # Bounded concurrency: whisper runs on `workers` threads and submit() blocks
+        # once the stage queues are full, so a large backlog isn't held in memory
+        self.pipeline = TranscriptionPipeline(model=model, language=language,
+                                              output_formats=output_formats, use_coreml=use_coreml,
+                                              vad=vad, whisper_workers=workers,
+                                              on_complete=self.finished, replace=True)
+        self.stopped = threading.Event()
+
+    def notify(self, path):
+        """Called from watcher threads when a path may have changed"""
+        self.events.put(os.path.abspath(path))
+
+    def output_dir_for(self, path):
+        """exports mirror: <output_root>/<watched folder name>/<relative dirs>/<file stem>"""
+        for folder in self.folders:
+            if path.startswith(folder + os.sep):
+                relative = os.path.relpath(path, folder)
+                stem = os.path.splitext(relative)[0]
+                return os.path.join(self.output_root, os.path.basename(folder), stem)
+        return os.path.join(self.output_root, os.path.splitext(os.path.basename(path))[0])
+
+    def scan(self):
+        """Queue every candidate file under the watched folders"""
+        for folder in self.folders:
+            for root, dirs, files in os.walk(folder):
+                # Never pick up our own outputs if they live inside a watched folder
+                dirs[:] = [d for d in dirs if not d.startswith(".")
+                           and os.path.join(root, d) != self.output_root]
+                for name in files:
+                    self.notify(os.path.join(root, name))
+
+    def observe(self, path):
+        """Track a path until its size and mtime stop changing"""
+        if not is_candidate(path) or path.startswith(self.output_root + os.sep):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.pending.pop(path, None)
+            return
+        signature = (stat.st_size, stat.st_mtime)
+        if self.state.is_current(path, *signature):
+            self.pending.pop(path, None)
+            return
+        with self.in_flight_lock:
+            if path in self.in_flight_paths:
+                self.dirty_paths.add(path)
+                return
+        previous = self.pending.get(path)
+        if previous is None or previous[:2] != signature:
+            self.pending[path] = (*signature, time.time())
+
+    def collect_settled(self):
+        """Move files whose size and mtime held for settle_seconds to the ready list"""
+        now = time.time()
+        for path, (size, mtime, seen_at) in list(self.pending.items()):
+            if now - seen_at < self.settle_seconds:
+                continue
+            # Re-stat: writers that don't touch mtime still change the size
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime) != (size, mtime):
+                self.pending[path] = (stat.st_size, stat.st_mtime, now)
+                continue
+            if size == 0:
+                continue
+            del self.pending[path]
+            if path not in self.ready:
+                self.ready.append(path)
+                self.ready_since = self.ready_since or now
+
+    def flush_batch(self, force=False):
+        """Submit ready files once the batch is full or the batch window has passed"""
+        if not self.ready:
+            return
+        if not force and len(self.ready) < self.batch_size and \
+                time.time() - self.ready_since < self.batch_window:
+            return
+
+        batch, self.ready = self.ready[:self.batch_size], self.ready[self.batch_size:]
+        self.ready_since = time.time() if self.ready else None
+        print(f"Submitting batch of {len(batch)} file(s)")
+        for path in sorted(batch):
+            self.submit(path)
+
+    def submit(self, path):
+        try:
+            stat = os.stat(path)
+            sha256 = file_sha256(path)
+        except OSError as e:
+            print(f"Skipping {path}: {e}")
+            return
+        size, mtime = stat.st_size, stat.st_mtime
+
+        outputs = self.state.outputs_for(sha256)
+        if outputs:
+            print(f"Duplicate of an already transcribed file, skipping: {path}")
+            self.state.record(path, size, mtime, sha256, "duplicate", outputs=outputs)
+            return
+
+        with self.in_flight_lock:
+            if sha256 in self.in_flight:
+                # Same content is being transcribed; look again after it finishes
+                print(f"Duplicate of a file in progress, deferring: {path}")
+                self.pending[path] = (size, mtime, time.time())
+                return
+            self.in_flight.add(sha256)
+            self.in_flight_paths.add(path)
+
+        output_dir = self.output_dir_for(path)
+        print(f"Transcribing {path} -> {output_dir}")
+        self.pipeline.submit(path, output_dir=output_dir, context=(size, mtime, sha256))
+
+    def finished(self, item, result):
+        """Pipeline completion callback"""
+        path = item["file_path"]
+        size, mtime, sha256 = item["context"]
+        try:
+            if result and result["outputs"]:
+                self.state.record(path, size, mtime, sha256, "completed",
+                                  outputs=result["outputs"])
+                print(f"Finished {path}")
+            else:
+                # Recorded so it isn't retried in a loop; a changed file is picked up again
+                self.state.record(path, size, mtime, sha256, "failed",
+                                  error="transcription produced no output")
+                print(f"Failed {path}")
+        finally:
+            with self.in_flight_lock:
+                self.in_flight.discard(sha256)
+                self.in_flight_paths.discard(path)
+                changed = path in self.dirty_paths
+                self.dirty_paths.discard(path)
+            # The recorded (size, mtime) is from before the change, so this queues it again
+            if changed:
+                self.notify(path)
+
+    def run(self):
+        for folder in self.folders:
+            if not os.path.isdir(folder):
+                raise NotADirectoryError(folder)
+        os.makedirs(self.output_root, exist_ok=True)
+
+        observer = None
+        if not self.use_polling:
+            observer = Observer()
+            handler = ChangeHandler(self)
+            for folder in self.folders:
+                observer.schedule(handler, folder, recursive=True)
+            observer.start()
+            print(f"Watching {', '.join(self.folders)} for changes")
+        else:
+            print(f"Polling {', '.join(self.folders)} every {self.poll_interval}s")
+
+        # Catch up on anything that arrived or changed while we weren't running
+        self.scan()
+        last_scan = time.time()
+        try:
+            while not self.stopped.is_set():
+                try:
+                    path = self.events.get(timeout=1)
+                    self.observe(path)
+                    while True:
+                        self.observe(self.events.get_nowait())
+                except queue.Empty:
+                    pass
+
+                if self.use_polling and time.time() - last_scan >= self.poll_interval:
+                    self.scan()
+                    last_scan = time.time()
+
+                self.collect_settled()
+                self.flush_batch()
+        except KeyboardInterrupt:
+            print("Stopping, waiting for running transcriptions to finish")
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
+            self.pipeline.close()
+            print(format_report(self.pipeline.report()))
+
+    def stop(self):
+        self.stopped.set()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Transcribe recordings as they appear in watched folders")
+    parser.add_argument("folders", nargs="+", help="Folders to watch (recursively)")
+    parser.add_argument("--output", default="exports/watched",
+                        help="Root of the output tree mirroring the watched folders")
+    parser.add_argument("--state", help="State file (default: <output>/.watch_state.json)")
+    parser.add_argument("--model", default="large-v3", help="Model to use (tiny.en, base.en, small.en, medium.en, large-v3)")
+    parser.add_argument("--language", help="Language code (en, fr, etc.)")
+    parser.add_argument("--formats", default="txt,srt,vtt", help="Output formats (comma-separated)")
+    parser.add_argument("--no-coreml", action="store_true", help="Disable CoreML acceleration")
+    parser.add_argument("--vad", action="store_true", help="Skip silence before transcribing")
+    parser.add_argument("--workers", type=int, default=1, help="Files transcribed at the same time")
+    parser.add_argument("--batch-size", type=int, default=8, help="Maximum files per batch")
+    parser.add_argument("--batch-window", type=float, default=10,
+                        help="Seconds to gather settled files before submitting a partial batch")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help="Seconds a file must stay unchanged before it is transcribed")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help="Seconds between rescans when polling")
+    parser.add_argument("--polling", action="store_true", help="Poll even if watchdog is installed")
+
+    args = parser.parse_args()
+    if Observer is None and not args.polling:
+        print("watchdog not installed, falling back to polling (pip install watchdog)")
+
+    daemon = WatchDaemon(args.folders, args.output,
+                         args.state or os.path.join(args.output, ".watch_state.json"),
+                         model=args.model, language=args.language,
+                         output_formats=args.formats.split(","), use_coreml=not args.no_coreml,
+                         vad=args.vad, workers=max(1, args.workers), batch_size=max(1, args.batch_size),
+                         batch_window=args.batch_window, settle_seconds=args.settle,
+                         poll_interval=args.poll_interval, use_polling=args.polling)
+    daemon.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -30,10 +30,13 @@ show_help() {
     echo "                        Available: tiny.en, base.en, small.en, medium.en, large-v3"
     echo "  -l, --language LANG   Specify language code (default: auto-detect)"
     echo "  -f, --formats FORMATS Comma-separated output formats (default: txt,srt,vtt)"
+    echo "  -r, --range START-END Only re-transcribe this time range (e.g. 12:30-13:00)"
+    echo "  -e, --existing DIR    Previous output directory to splice the range into"
     echo "  -h, --help            Show this help message"
     echo ""
     echo "Example:"
     echo "  ./transcribe.sh -m medium.en -f txt,srt recording.m4a"
+    echo "  ./transcribe.sh -m large-v3 -r 12:30-13:00 -e exports/recording_20250101_120000 recording.m4a"
     echo ""
 }
 
@@ -41,6 +44,8 @@ show_help() {
 MODEL="tiny.en"
 LANGUAGE=""
 FORMATS="txt,srt,vtt"
+RANGE=""
+EXISTING=""
 FILE=""
 
 # Parse arguments
@@ -58,6 +63,14 @@ while [[ $# -gt 0 ]]; do
             FORMATS="$2"
             shift 2
             ;;
+        -r|--range)
+            RANGE="$2"
+            shift 2
+            ;;
+        -e|--existing)
+            EXISTING="$2"
+            shift 2
+            ;;
         -h|--help)
             show_help
             exit 0
@@ -101,11 +114,25 @@ if [[ -n "$LANGUAGE" ]]; then
 else
     echo -e "${YELLOW}Language:${NC}  Auto-detect"
 fi
+if [[ -n "$RANGE" ]]; then
+    echo -e "${YELLOW}Range:${NC}     $RANGE (into $EXISTING)"
+fi
 echo ""
 echo "Starting transcription..."
 
+# Check range arguments
+if [[ -n "$RANGE" && -z "$EXISTING" ]]; then
+    echo -e "${RED}Error: --range requires --existing.${NC}"
+    exit 1
+fi
+
 # Construct command
-CMD="python src/transcribe.py \"$FILE\" --model \"$MODEL\" --formats \"$FORMATS\""
+if [[ -n "$RANGE" ]]; then
+    # Regenerate whichever formats the existing transcription already has
+    CMD="python src/transcribe.py \"$FILE\" --model \"$MODEL\" --range \"$RANGE\" --existing \"$EXISTING\""
+else
+    CMD="python src/transcribe.py \"$FILE\" --model \"$MODEL\" --formats \"$FORMATS\""
+fi
 if [[ -n "$LANGUAGE" ]]; then
     CMD="$CMD --language \"$LANGUAGE\""
 fi
@@ -2,9 +2,9 @@
 import os
 import sys
 import json
+import logging
 import subprocess
 import threading
-import shutil
 from datetime import datetime
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QLabel, QPushButton, QComboBox,
@@ -16,18 +16,25 @@ from PyQt6.QtGui import QFont, QDragEnterEvent, QDropEvent
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from src.transcribe import transcribe_file
+from src.transcribe import transcribe_draft, refine_outputs, default_output_dir
+from src.transcriber import Transcriber
+from src.subtitles import format_timestamp
 
 # Global output directory
 DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "exports")
 
+# Shared engine configuration for all transcriptions started from the UI
+transcriber = Transcriber(exports_dir=DEFAULT_OUTPUT_DIR)
+
 class Worker(QObject):
     """Worker thread for transcription to avoid freezing UI"""
     finished = pyqtSignal(dict)
+    draft = pyqtSignal(dict)
     progress = pyqtSignal(str)
     error = pyqtSignal(str)
     
-    def __init__(self, file_path, model, language, formats, use_coreml, output_dir=None):
+    def __init__(self, file_path, model, language, formats, use_coreml, output_dir=None,
+                 two_pass=False, vad=False):
         super().__init__()
         self.file_path = file_path
         self.model = model
@@ -35,20 +42,65 @@ class Worker(QObject):
         self.formats = formats
         self.use_coreml = use_coreml
         self.output_dir = output_dir or DEFAULT_OUTPUT_DIR
+        self.two_pass = two_pass
+        self.vad = vad
     
     def run(self):
         try:
             self.progress.emit(f"Starting transcription of {os.path.basename(self.file_path)}")
-            result = transcribe_file(
-                self.file_path,
-                model=self.model,
-                language=self.language,
-                output_formats=self.formats,
-                use_coreml=self.use_coreml
-            )
+            result = None
+            if self.two_pass:
+                self.progress.emit("Creating a quick draft transcript...")
+                draft = transcribe_draft(
+                    self.file_path,
+                    language=self.language,
+                    output_formats=self.formats,
+                    use_coreml=self.use_coreml,
+                    output_dir=default_output_dir(self.file_path, self.output_dir),
+                    vad=self.vad
+                )
+                if draft and draft["outputs"]:
+                    self.draft.emit(draft)
+                    self.progress.emit(f"Refining with {self.model} in the background...")
+                    result = refine_outputs(
+                        self.file_path,
+                        draft["output_dir"],
+                        model=self.model,
+                        language=self.language,
+                        output_formats=self.formats,
+                        use_coreml=self.use_coreml,
+                        vad=self.vad
+                    )
+                    if not result:
+                        self.progress.emit("Refine pass failed - the draft transcript is kept")
+                        result = draft
+                else:
+                    self.progress.emit("Draft pass unavailable, running full transcription")
+            
+            if result is None:
+                result = transcriber.transcribe_sync(
+                    self.file_path,
+                    on_segment=self.segment_ready,
+                    model=self.model,
+                    language=self.language,
+                    output_formats=self.formats,
+                    output_dir=default_output_dir(self.file_path, self.output_dir),
+                    use_coreml=self.use_coreml,
+                    vad=self.vad
+                )
             
             # Check output dirs - this is for debugging
             if result:
+                if result.get("language"):
+                    detected = result["language"]
+                    self.progress.emit(f"Detected language: {detected['code']} "
+                                       f"({detected['confidence']:.0%} confidence), "
+                                       f"transcribed with {result['model']}")
+                
+                if result.get("vad"):
+                    self.progress.emit(f"Skipped {result['vad']['skipped_seconds']:.0f}s of silence "
+                                       f"({result['vad']['skipped_ratio']:.0%} of the audio)")
+                
                 output_dir = result["output_dir"]
                 self.progress.emit(f"Output directory: {output_dir}")
                 
@@ -60,21 +112,6 @@ class Worker(QObject):
                         self.progress.emit(f"Files in output directory: {', '.join(files)}")
                     else:
                         self.progress.emit("Output directory exists but is empty")
-                        
-                        # Try to manually copy the file as a fallback
-                        try:
-                            base_name = os.path.basename(self.file_path)
-                            name_without_ext = os.path.splitext(base_name)[0]
-                            
-                            for fmt in self.formats:
-                                # Check if files exist in project dir and not in output dir
-                                potential_file = f"{name_without_ext}.{fmt}"
-                                if os.path.exists(potential_file):
-                                    self.progress.emit(f"Found file in project root: {potential_file}")
-                                    shutil.copy(potential_file, os.path.join(output_dir, potential_file))
-                                    self.progress.emit(f"Copied to output directory")
-                        except Exception as e:
-                            self.progress.emit(f"Error copying files: {str(e)}")
                 else:
                     self.progress.emit("Output directory does not exist")
                 
@@ -84,6 +121,10 @@ class Worker(QObject):
         except Exception as e:
             self.error.emit(f"Error during transcription: {str(e)}")
 
+    def segment_ready(self, segment):
+        """Show each segment in the log as soon as Whisper decodes it"""
+        self.progress.emit(f"[{format_timestamp(segment.start, '.')[:-4]}] {segment.text}")
+
 class DropArea(QWidget):
     """Widget that accepts drag and drop of audio files"""
     fileDropped = pyqtSignal(str)
@@ -208,6 +249,12 @@ class MainWindow(QMainWindow):
         self.coreml_checkbox = QCheckBox("Use CoreML Acceleration")
         self.coreml_checkbox.setChecked(True)
         coreml_layout.addWidget(self.coreml_checkbox)
+        self.two_pass_checkbox = QCheckBox("Quick draft first, then refine")
+        self.two_pass_checkbox.setChecked(False)
+        coreml_layout.addWidget(self.two_pass_checkbox)
+        self.vad_checkbox = QCheckBox("Skip silence before transcribing")
+        self.vad_checkbox.setChecked(False)
+        coreml_layout.addWidget(self.vad_checkbox)
         settings_layout.addLayout(coreml_layout)
         
         settings_group.setLayout(settings_layout)
@@ -366,10 +413,16 @@ class MainWindow(QMainWindow):
         # Get CoreML setting
         use_coreml = self.coreml_checkbox.isChecked()
         
+        # Get two-pass setting
+        two_pass = self.two_pass_checkbox.isChecked()
+        vad = self.vad_checkbox.isChecked()
+        
         # Start worker thread
-        self.worker = Worker(file_path, model, language, formats, use_coreml, self.output_dir)
+        self.worker = Worker(file_path, model, language, formats, use_coreml, self.output_dir,
+                             two_pass=two_pass, vad=vad)
         self.worker_thread = threading.Thread(target=self.worker.run)
         self.worker.progress.connect(self.log)
+        self.worker.draft.connect(self.handle_draft_ready)
         self.worker.finished.connect(self.handle_transcription_finished)
         self.worker.error.connect(self.handle_transcription_error)
         
@@ -381,6 +434,12 @@ class MainWindow(QMainWindow):
         # Start transcription
         self.worker_thread.start()
     
+    def handle_draft_ready(self, result):
+        """Handle the draft pass of a two-pass transcription"""
+        self.log(f"Draft ready ({result['model']}), it will be replaced when refining finishes:")
+        for fmt, path in result["outputs"].items():
+            self.log(f"- {fmt.upper()} draft: {path}")
+    
     def handle_transcription_finished(self, result):
         """Handle successful transcription"""
         self.log(f"Transcription completed successfully!")
@@ -438,6 +497,7 @@ class MainWindow(QMainWindow):
         self.worker_thread = None
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
@@ -2,8 +2,13 @@
 import os
 import sys
 import json
+import logging
+import time
+import heapq
 import threading
+import hashlib
 import uuid
+from collections import deque
 from datetime import datetime
 from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for
 from flask_socketio import SocketIO, emit
@@ -11,45 +16,360 @@ from werkzeug.utils import secure_filename
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from src.transcribe import transcribe_file
+from src.transcribe import transcribe_draft, refine_outputs, pick_draft_model, transcribe_with_reuse
+from src.transcriber import Transcriber
+from src.segment_store import Segment
+from src.fingerprint import FingerprintIndex, fingerprint_file, DEFAULT_INDEX_DIR
+from src.streaming import StreamingTranscoder
+from src.capacity import (estimate_duration, free_memory_bytes, free_disk_bytes,
+                          RealtimeFactorHistory, bytes_per_second)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'whispertron-web-secret-key'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 
-socketio = SocketIO(app, cors_allowed_origins="*", ping_timeout=300, ping_interval=30)
+# Jobs run on OS threads, so emits must not depend on an eventlet hub waking up
+socketio = SocketIO(app, async_mode='threading', cors_allowed_origins="*",
+                    ping_timeout=300, ping_interval=30)
 
-# Ensure upload directory exists
+# Ensure upload and export directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+os.makedirs('exports', exist_ok=True)
 
 # Store active transcription jobs
 active_jobs = {}
 
+# Store in-progress chunked uploads
+active_uploads = {}
+# Reentrant: admission checks read active_uploads while /upload/init holds it
+uploads_lock = threading.RLock()
+
+# Admission limits. Beyond these, uploads are refused with 429 and a Retry-After.
+MAX_CONCURRENT_JOBS = int(os.environ.get('WHISPERTRON_WORKERS', 1))
+MAX_QUEUE_DEPTH = int(os.environ.get('WHISPERTRON_MAX_QUEUE', 20))
+MAX_QUEUED_AUDIO_SECONDS = 4 * 3600
+MIN_FREE_MEMORY = 1024 * 1024 * 1024  # 1GB
+MIN_FREE_DISK = 2 * 1024 * 1024 * 1024  # 2GB
+RESOURCE_RETRY_AFTER = 60
+
+# Shared engine configuration; the CPU budget is split between concurrent jobs
+transcriber = Transcriber(exports_dir='exports', max_concurrent=MAX_CONCURRENT_JOBS)
+
+# Fingerprints of finished jobs, so re-exported or edited uploads reuse their transcripts
+fingerprints = FingerprintIndex(DEFAULT_INDEX_DIR)
+
+# Suggested chunk size for chunked uploads, and read size while streaming a chunk to disk
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+STREAM_READ_SIZE = 1024 * 1024
+
+# Each chunked upload holds a file handle (and an FFmpeg process for streamed formats),
+# so only this many may be in progress, and ones idle for the timeout are aborted
+MAX_ACTIVE_UPLOADS = int(os.environ.get('WHISPERTRON_MAX_UPLOADS', 50))
+UPLOAD_IDLE_TIMEOUT = int(os.environ.get('WHISPERTRON_UPLOAD_TIMEOUT', 30 * 60))
+UPLOAD_SWEEP_INTERVAL = 60
+
 ALLOWED_EXTENSIONS = {'mp3', 'wav', 'm4a', 'mp4', 'mov', 'ogg', 'opus'}
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+class RefineScheduler:
+    """
+    Runs the refine pass of two-pass jobs one at a time in the background.
+
+    Drafts always take priority: while any draft is running no refine starts, and
+    a draft arriving while a refine runs preempts it. The preempted job goes back
+    to the front of the queue and restarts once the drafts are done.
+    
+    A running refine uses one job's share of the CPU next to the queue's workers,
+    so JobQueue counts it when estimating start times and admitting uploads.
+    """
+    
+    def __init__(self):
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.active_drafts = 0
+        self.current = None
+        self.current_started_at = None
+        self.current_process = None
+        self.preempted = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def submit(self, worker):
+        with self.condition:
+            self.queue.append(worker)
+            self.condition.notify_all()
+    
+    def draft_started(self):
+        with self.condition:
+            self.active_drafts += 1
+            if self.current is not None and not self.preempted:
+                process = self.current_process
+                # Once whisper has exited the refine is only publishing its outputs
+                if process is None or process.poll() is None:
+                    self.preempted = True
+                    if process is not None:
+                        process.terminate()
+    
+    def draft_finished(self):
+        with self.condition:
+            self.active_drafts -= 1
+            self.condition.notify_all()
+    
+    def _set_process(self, process):
+        with self.condition:
+            self.current_process = process
+            if self.preempted:
+                process.terminate()
+    
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue or self.active_drafts > 0:
+                    self.condition.wait()
+                worker = self.queue.popleft()
+                self.current = worker
+                self.current_started_at = time.time()
+                self.current_process = None
+                self.preempted = False
+            job_queue.update_estimates()
+            
+            result = worker.refine(process_callback=self._set_process)
+            
+            with self.condition:
+                # Whisper may have finished before the terminate landed; keep a good result
+                preempted = self.preempted and not (result and result.get('outputs'))
+                self.current = None
+                self.current_started_at = None
+                self.current_process = None
+                if preempted:
+                    self.queue.appendleft(worker)
+            job_queue.update_estimates()
+            
+            if preempted:
+                worker.refine_preempted()
+            else:
+                worker.refine_finished(result)
+    
+    def snapshot(self):
+        """(running worker, its start time) or (None, None), plus the workers waiting to refine"""
+        with self.condition:
+            return self.current, self.current_started_at, list(self.queue)
+
+class JobQueue:
+    """
+    Runs transcription jobs on a fixed number of worker threads.
+
+    Every queued and running job carries an estimated start and finish time,
+    computed from its audio duration and the measured real-time factor of its
+    model, and refreshed whenever the queue changes.
+    """
+    
+    def __init__(self, workers, history):
+        self.workers = workers
+        self.history = history
+        self.pending = deque()
+        self.running = []
+        self.condition = threading.Condition()
+        for _ in range(workers):
+            threading.Thread(target=self.run, daemon=True).start()
+    
+    def slot_model(self, worker):
+        """
+        Model a job's slot time is measured and estimated under: the requested
+        one, even if auto-detect routes it (large-v3 to medium.en for English
+        audio), so measurements land where the next estimate looks.
+        """
+        if worker.two_pass and worker.drafted is not False:
+            # The slot is only held for the draft, the refine runs in the background
+            return pick_draft_model(worker.language) or worker.model
+        return worker.model
+    
+    def estimated_seconds(self, worker):
+        return worker.audio_seconds * self.history.estimate(self.slot_model(worker),
+                                                            transcriber.threads_per_job)
+    
+    def refine_seconds(self, worker):
+        return worker.audio_seconds * self.history.estimate(worker.model, transcriber.threads_per_job)
+    
+    def submit(self, worker):
+        worker.estimated_seconds = self.estimated_seconds(worker)
+        with self.condition:
+            self.pending.append(worker)
+            self.condition.notify()
+        self.update_estimates()
+    
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                worker = self.pending.popleft()
+                worker.started_at = time.time()
+                self.running.append(worker)
+            self.update_estimates()
+            
+            worker.run()
+            
+            with self.condition:
+                self.running.remove(worker)
+            
+            # Reused audio isn't decoded, so it says nothing about the model's speed
+            if worker.result and worker.status in ('completed', 'refining') and 'reuse' not in worker.result:
+                self.history.record(self.slot_model(worker), transcriber.threads_per_job,
+                                    worker.audio_seconds, time.time() - worker.started_at)
+            self.update_estimates()
+    
+    def schedule(self):
+        """
+        Simulate the queue: returns [(worker, start, finish)] for running and
+        pending jobs, and a running refine pass, assuming each finishes after its
+        estimated duration.
+        """
+        now = time.time()
+        with self.condition:
+            running = list(self.running)
+            pending = list(self.pending)
+        refining, refine_started, _ = refine_scheduler.snapshot()
+        
+        plan = []
+        slots = []
+        for worker in running:
+            finish = max(now, worker.started_at + worker.estimated_seconds)
+            plan.append((worker, worker.started_at, finish))
+            slots.append(finish)
+        if refining is not None and refining not in running:
+            finish = max(now, refine_started + self.refine_seconds(refining))
+            plan.append((refining, refine_started, finish))
+            slots.append(finish)
+        slots += [now] * max(0, self.workers - len(slots))
+        heapq.heapify(slots)
+        # With a refine on top of busy workers, a job only starts once two of them are done
+        while len(slots) > self.workers:
+            heapq.heappop(slots)
+        
+        for worker in pending:
+            start = heapq.heappop(slots)
+            finish = start + worker.estimated_seconds
+            heapq.heappush(slots, finish)
+            plan.append((worker, start, finish))
+        return plan
+    
+    def update_estimates(self):
+        """Refresh every job's estimate and push it to the clients"""
+        position = 0
+        for worker, start, finish in self.schedule():
+            worker.estimated_start = start
+            worker.estimated_finish = finish
+            if worker.status != 'queued':
+                continue
+            position += 1
+            worker.queue_position = position
+            socketio.emit('transcription_progress', {
+                'job_id': worker.job_id,
+                'status': 'queued',
+                'queue_position': position,
+                'estimated_start': start,
+                'estimated_finish': finish,
+                'message': f'Queued at position {position}'
+            })
+    
+    def check_admission(self, incoming_bytes=0):
+        """
+        Return None if a new job can be accepted, otherwise (reason, retry_after_seconds).
+        
+        Chunked uploads still in progress hold a place in the queue, their expected
+        audio and the bytes they have yet to write.
+        """
+        now = time.time()
+        plan = self.schedule()
+        queued = [(worker, start) for worker, start, _ in plan if worker.status == 'queued']
+        with uploads_lock:
+            uploads = list(active_uploads.values())
+        
+        waiting = len(queued) + len(uploads)
+        if waiting >= MAX_QUEUE_DEPTH:
+            # A place frees up each time a queued job starts
+            must_start = waiting - MAX_QUEUE_DEPTH
+            if must_start < len(queued):
+                return 'Queue is full', queued[must_start][1] - now
+            return 'Queue is full', RESOURCE_RETRY_AFTER
+        
+        # Refine passes still to run are queued work too
+        _, _, waiting_refines = refine_scheduler.snapshot()
+        queued_audio = sum(worker.audio_seconds for worker, _ in queued) + \
+            sum(worker.audio_seconds for worker in waiting_refines) + \
+            sum(upload.size / bytes_per_second(upload.filename) for upload in uploads)
+        if queued_audio >= MAX_QUEUED_AUDIO_SECONDS:
+            # Wait until enough queued audio has started to get back under the limit
+            for worker, start in queued:
+                queued_audio -= worker.audio_seconds
+                if queued_audio < MAX_QUEUED_AUDIO_SECONDS:
+                    return 'Too much audio queued', start - now
+            return 'Too much audio queued', RESOURCE_RETRY_AFTER
+        
+        free_memory = free_memory_bytes()
+        if free_memory is not None and free_memory < MIN_FREE_MEMORY:
+            return 'Server is low on memory', RESOURCE_RETRY_AFTER
+        
+        incoming_bytes += sum(upload.size - upload.offset for upload in uploads)
+        if free_disk_bytes(app.config['UPLOAD_FOLDER']) - incoming_bytes < MIN_FREE_DISK:
+            return 'Server is low on disk space', RESOURCE_RETRY_AFTER
+        
+        return None
+
+job_queue = JobQueue(MAX_CONCURRENT_JOBS,
+                     RealtimeFactorHistory(os.path.join('exports', 'realtime_factors.json')))
+
+refine_scheduler = RefineScheduler()
+
+def over_capacity(incoming_bytes=0):
+    """Return a 429 response if the server can't take another job, else None"""
+    refusal = job_queue.check_admission(incoming_bytes)
+    if refusal is None:
+        return None
+    reason, retry_after = refusal
+    retry_after = max(1, int(retry_after + 0.5))
+    response = jsonify({'error': f'{reason}, please retry in {retry_after} seconds',
+                        'retry_after': retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
 class WebWorker:
     """Worker class for web transcription jobs"""
     
-    def __init__(self, job_id, file_path, model, language, formats, use_coreml):
+    def __init__(self, job_id, file_path, model, language, formats, use_coreml, two_pass=False,
+                 vad=False):
         self.job_id = job_id
         self.file_path = file_path
         self.model = model
         self.language = language
         self.formats = formats
         self.use_coreml = use_coreml
-        self.status = 'pending'
+        self.two_pass = two_pass
+        self.vad = vad
+        self.status = 'queued'
+        self.audio_seconds = estimate_duration(file_path)
+        self.estimated_seconds = None
+        self.estimated_start = None
+        self.estimated_finish = None
+        self.queue_position = None
+        self.started_at = None
+        self.tier = None
+        # False once a two-pass job's draft has failed and it ran in full instead
+        self.drafted = None
+        self.sha256 = None
+        self.fingerprint = None
         self.result = None
         self.error = None
     
     def run(self):
         try:
             self.status = 'running'
-            active_jobs[self.job_id] = self
             
             socketio.emit('transcription_progress', {
                 'job_id': self.job_id,
@@ -57,25 +377,60 @@ class WebWorker:
                 'message': f'Starting transcription of {os.path.basename(self.file_path)}'
             })
             
-            # Send periodic updates during transcription
-            socketio.emit('transcription_progress', {
-                'job_id': self.job_id,
-                'status': 'running',
-                'message': 'Transcribing audio... this may take a few minutes'
-            })
+            self.fingerprint = fingerprint_file(self.file_path)
+            reuse = (fingerprints.plan_reuse(self.fingerprint, model=self.model, language=self.language)
+                     if self.fingerprint else None)
             
-            result = transcribe_file(
-                self.file_path,
-                model=self.model,
-                language=self.language,
-                output_formats=self.formats,
-                use_coreml=self.use_coreml
-            )
+            if reuse:
+                result = self.run_reuse(reuse)
+            else:
+                if self.two_pass and self.run_draft():
+                    return
+                
+                # Tell the client when to expect the result
+                socketio.emit('transcription_progress', {
+                    'job_id': self.job_id,
+                    'status': 'running',
+                    'estimated_finish': self.estimated_finish,
+                    'message': f'Transcribing {self.audio_seconds / 60:.0f} min of audio...'
+                })
+                
+                result = transcriber.transcribe_sync(
+                    self.file_path,
+                    on_segment=self.segment_ready,
+                    model=self.model,
+                    language=self.language,
+                    output_formats=self.formats,
+                    use_coreml=self.use_coreml,
+                    vad=self.vad
+                )
             
             if result and result.get('outputs'):
                 self.status = 'completed'
+                self.tier = 'final'
                 self.result = result
                 
+                # Nothing new to index when every second was reused
+                if not reuse or reuse['gaps']:
+                    self.index_result(result, language=self.language or (reuse or {}).get('language'))
+                
+                if result.get('language'):
+                    detected = result['language']
+                    socketio.emit('transcription_progress', {
+                        'job_id': self.job_id,
+                        'status': 'running',
+                        'message': f"Detected language: {detected['code']} "
+                                   f"({detected['confidence']:.0%} confidence), transcribed with {result['model']}"
+                    })
+                
+                if result.get('vad'):
+                    socketio.emit('transcription_progress', {
+                        'job_id': self.job_id,
+                        'status': 'running',
+                        'message': f"Skipped {result['vad']['skipped_seconds']:.0f}s of silence "
+                                   f"({result['vad']['skipped_ratio']:.0%} of the audio)"
+                    })
+                
                 socketio.emit('transcription_progress', {
                     'job_id': self.job_id,
                     'status': 'completed',
@@ -106,6 +461,279 @@ class WebWorker:
                 'status': 'failed',
                 'message': f'Error during transcription: {str(e)}'
             })
+    
+    def run_reuse(self, reuse):
+        """Transcribe only the audio that earlier transcriptions don't cover"""
+        sources = ', '.join(sorted({s['source'] for s in reuse['sources']}))
+        socketio.emit('transcription_progress', {
+            'job_id': self.job_id,
+            'status': 'running',
+            'message': f"Reusing {reuse['reused_ms'] / 60000:.1f} min already transcribed in {sources}, "
+                       f"transcribing {sum(end - start for start, end in reuse['gaps']) / 60000:.1f} min of new audio..."
+        })
+        for segment in reuse['segments']:
+            self.segment_ready(Segment(segment['start'], segment['end'], segment['text']))
+        
+        result = transcribe_with_reuse(
+            self.file_path,
+            reuse,
+            model=self.model,
+            language=self.language,
+            output_formats=self.formats,
+            use_coreml=self.use_coreml,
+            threads=transcriber.threads_per_job
+        )
+        if result:
+            socketio.emit('transcription_progress', {
+                'job_id': self.job_id,
+                'status': 'running',
+                'message': f"Reused {result['reuse']['reused_seconds']:.0f}s of "
+                           f"{result['reuse']['total_seconds']:.0f}s ({result['reuse']['reused_ratio']:.0%} of the audio)"
+            })
+        return result
+    
+    def index_result(self, result, language=None):
+        """
+        Remember a finished transcript so later uploads of the same audio can reuse
+        it. language defaults to the job's; a language detected in result wins.
+        """
+        if not self.fingerprint:
+            return
+        try:
+            fingerprints.add_result(self.fingerprint, result, language=language or self.language)
+        except OSError as e:
+            print(f"Could not index transcript of job {self.job_id}: {e}")
+    
+    def segment_ready(self, segment):
+        """Stream each decoded segment to the browser as a live preview"""
+        socketio.emit('transcription_segment', {
+            'job_id': self.job_id,
+            'start': segment.start,
+            'end': segment.end,
+            'text': segment.text
+        })
+    
+    def run_draft(self):
+        """
+        Produce a fast draft and queue the refine pass. Returns False if no
+        draft could be made, in which case the job runs as a single pass.
+        """
+        socketio.emit('transcription_progress', {
+            'job_id': self.job_id,
+            'status': 'running',
+            'message': 'Creating a quick draft transcript...'
+        })
+        
+        refine_scheduler.draft_started()
+        try:
+            draft = transcribe_draft(
+                self.file_path,
+                language=self.language,
+                output_formats=self.formats,
+                use_coreml=self.use_coreml,
+                vad=self.vad,
+                threads=transcriber.threads_per_job
+            )
+        finally:
+            refine_scheduler.draft_finished()
+        
+        self.drafted = bool(draft and draft.get('outputs'))
+        if not self.drafted:
+            socketio.emit('transcription_progress', {
+                'job_id': self.job_id,
+                'status': 'running',
+                'message': 'Draft pass unavailable, running full transcription'
+            })
+            return False
+        
+        self.status = 'refining'
+        self.tier = 'draft'
+        self.result = draft
+        
+        socketio.emit('transcription_progress', {
+            'job_id': self.job_id,
+            'status': 'draft',
+            'tier': 'draft',
+            'message': f"Draft ready ({draft['model']}). Refining with {self.model} in the background...",
+            'result': draft
+        })
+        
+        refine_scheduler.submit(self)
+        return True
+    
+    def refine(self, process_callback=None):
+        """Run the accurate pass over the draft outputs (called by the scheduler)"""
+        try:
+            return refine_outputs(
+                self.file_path,
+                self.result['output_dir'],
+                model=self.model,
+                language=self.language,
+                output_formats=self.formats,
+                use_coreml=self.use_coreml,
+                process_callback=process_callback,
+                vad=self.vad,
+                # One job's share of the CPU, like the queue's workers
+                threads=transcriber.threads_per_job
+            )
+        except Exception as e:
+            print(f"Error in refine pass for job {self.job_id}: {str(e)}")
+            return None
+    
+    def refine_preempted(self):
+        socketio.emit('transcription_progress', {
+            'job_id': self.job_id,
+            'status': 'draft',
+            'tier': 'draft',
+            'message': 'Refine pass paused for incoming drafts, it will restart shortly'
+        })
+    
+    def refine_finished(self, result):
+        if result and result.get('outputs'):
+            self.status = 'completed'
+            self.tier = 'final'
+            self.result = result
+            self.index_result(result)
+            
+            socketio.emit('transcription_progress', {
+                'job_id': self.job_id,
+                'status': 'completed',
+                'tier': 'final',
+                'message': f"Transcription refined with {result['model']}!",
+                'result': result
+            })
+        else:
+            # The draft outputs stay available for download
+            self.status = 'completed'
+            self.error = 'Refine pass failed - draft transcript kept'
+            
+            socketio.emit('transcription_progress', {
+                'job_id': self.job_id,
+                'status': 'completed',
+                'tier': 'draft',
+                'message': 'Refine pass failed - the draft transcript is kept',
+                'result': self.result
+            })
+
+class ChunkedUpload:
+    """
+    A resumable upload written straight to its final path in uploads/.
+
+    Chunks must arrive in order at the current offset. Every byte is hashed as it
+    is written, and fed to a streaming transcoder for formats that support it.
+    """
+    
+    def __init__(self, job_id, filename, size, settings):
+        self.job_id = job_id
+        self.filename = filename
+        self.size = size
+        self.settings = settings
+        self.file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
+        self.offset = 0
+        self.hasher = hashlib.sha256()
+        self.lock = threading.Lock()
+        self.last_activity = time.time()
+        self.closed = False
+        self.file = open(self.file_path, 'wb')
+        self.transcoder = None
+        if StreamingTranscoder.supports(filename) and not filename.lower().endswith('.wav'):
+            wav_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{os.path.splitext(filename)[0]}.wav")
+            self.transcoder = StreamingTranscoder(wav_path)
+    
+    def append(self, stream):
+        """Copy a request body to disk; offset advances only by bytes actually written"""
+        while self.offset < self.size:
+            data = stream.read(min(STREAM_READ_SIZE, self.size - self.offset))
+            if not data:
+                break
+            self.file.write(data)
+            self.hasher.update(data)
+            if self.transcoder:
+                self.transcoder.feed(data)
+            self.offset += len(data)
+            self.last_activity = time.time()
+        self.file.flush()
+    
+    def finalize(self):
+        """Close the upload; returns the path the transcription should read"""
+        self.closed = True
+        self.file.close()
+        if self.transcoder:
+            wav_path = self.transcoder.finish()
+            if wav_path:
+                return wav_path
+        return self.file_path
+    
+    def abort(self):
+        self.closed = True
+        self.file.close()
+        if self.transcoder:
+            self.transcoder.abort()
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+def expire_uploads():
+    """Abort chunked uploads that have been idle for longer than UPLOAD_IDLE_TIMEOUT"""
+    now = time.time()
+    with uploads_lock:
+        idle = [(upload_id, upload) for upload_id, upload in active_uploads.items()
+                if now - upload.last_activity > UPLOAD_IDLE_TIMEOUT]
+    for upload_id, upload in idle:
+        # A chunk being written right now means the client is still there
+        if not upload.lock.acquire(blocking=False):
+            continue
+        try:
+            with uploads_lock:
+                if active_uploads.get(upload_id) is not upload:
+                    continue
+                del active_uploads[upload_id]
+            upload.abort()
+            print(f"Expired upload {upload_id} after {now - upload.last_activity:.0f}s without activity")
+        finally:
+            upload.lock.release()
+
+def sweep_uploads():
+    while True:
+        time.sleep(UPLOAD_SWEEP_INTERVAL)
+        try:
+            expire_uploads()
+        except Exception as e:
+            print(f"Error expiring uploads: {str(e)}")
+
+threading.Thread(target=sweep_uploads, daemon=True).start()
+
+def parse_settings(form):
+    """Read transcription settings from form data or a JSON dict"""
+    model = form.get('model', 'tiny.en')
+    language = form.get('language', None)
+    if language == 'auto':
+        language = None
+    
+    formats = form.getlist('formats') if hasattr(form, 'getlist') else form.get('formats', [])
+    if not formats:
+        formats = ['txt']
+    
+    def flag(name):
+        return str(form.get(name)).lower() == 'true'
+    
+    return {
+        'model': model,
+        'language': language,
+        'formats': formats,
+        'use_coreml': flag('use_coreml'),
+        'two_pass': flag('two_pass'),
+        'vad': flag('vad')
+    }
+
+def start_job(job_id, file_path, settings, sha256=None):
+    """Queue a transcription job for an uploaded file"""
+    worker = WebWorker(job_id, file_path, settings['model'], settings['language'],
+                       settings['formats'], settings['use_coreml'], settings['two_pass'],
+                       settings['vad'])
+    worker.sha256 = sha256
+    active_jobs[job_id] = worker
+    job_queue.submit(worker)
+    return worker
 
 @app.route('/')
 def index():
@@ -113,6 +741,10 @@ def index():
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    refusal = over_capacity(request.content_length or 0)
+    if refusal:
+        return refusal
+    
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
@@ -131,29 +763,131 @@ def upload_file():
     file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
     file.save(file_path)
     
-    # Get transcription settings
-    model = request.form.get('model', 'tiny.en')
-    language = request.form.get('language', None)
-    if language == 'auto':
-        language = None
+    # Queue transcription job
+    worker = start_job(job_id, file_path, parse_settings(request.form))
     
-    formats = request.form.getlist('formats')
-    if not formats:
-        formats = ['txt']
+    return jsonify({
+        'job_id': job_id,
+        'filename': filename,
+        'status': worker.status,
+        'estimated_start': worker.estimated_start,
+        'estimated_finish': worker.estimated_finish
+    })
+
+@app.route('/upload/init', methods=['POST'])
+def upload_init():
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename', ''))
+    if not filename:
+        return jsonify({'error': 'No file selected'}), 400
     
-    use_coreml = request.form.get('use_coreml') == 'true'
+    if not allowed_file(filename):
+        return jsonify({'error': 'File type not supported'}), 400
+    
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        size = 0
+    if size <= 0:
+        return jsonify({'error': 'Invalid file size'}), 400
+    if size > app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({'error': 'File size too large'}), 413
     
-    # Start transcription job
-    worker = WebWorker(job_id, file_path, model, language, formats, use_coreml)
-    thread = threading.Thread(target=worker.run)
-    thread.start()
+    job_id = str(uuid.uuid4())
+    # Admit and register under one lock so concurrent inits can't all take the last place
+    with uploads_lock:
+        refusal = over_capacity(size)
+        if refusal:
+            return refusal
+        
+        if len(active_uploads) >= MAX_ACTIVE_UPLOADS:
+            response = jsonify({'error': 'Too many uploads in progress, please retry later',
+                                'retry_after': RESOURCE_RETRY_AFTER})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(RESOURCE_RETRY_AFTER)
+            return response
+        upload = ChunkedUpload(job_id, filename, size, parse_settings(data))
+        active_uploads[job_id] = upload
     
     return jsonify({
-        'job_id': job_id,
-        'filename': filename,
-        'status': 'started'
+        'upload_id': job_id,
+        'offset': 0,
+        'chunk_size': UPLOAD_CHUNK_SIZE
+    })
+
+@app.route('/upload/<upload_id>', methods=['GET'])
+def upload_offset(upload_id):
+    upload = active_uploads.get(upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    # A client checking where to resume is still active
+    upload.last_activity = time.time()
+    return jsonify({'upload_id': upload_id, 'offset': upload.offset, 'size': upload.size})
+
+@app.route('/upload/<upload_id>/chunk', methods=['PUT'])
+def upload_chunk(upload_id):
+    upload = active_uploads.get(upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    if not upload.lock.acquire(blocking=False):
+        return jsonify({'error': 'Another chunk is in progress', 'offset': upload.offset}), 409
+    try:
+        if upload.closed:
+            return jsonify({'error': 'Upload not found'}), 404
+        offset = request.args.get('offset', type=int)
+        if offset != upload.offset:
+            return jsonify({'error': 'Offset mismatch', 'offset': upload.offset}), 409
+        
+        try:
+            upload.append(request.stream)
+        except Exception as e:
+            # A dropped connection keeps everything received so far
+            print(f"Chunk upload interrupted for {upload_id}: {str(e)}")
+        
+        return jsonify({'offset': upload.offset, 'size': upload.size})
+    finally:
+        upload.lock.release()
+
+@app.route('/upload/<upload_id>/finalize', methods=['POST'])
+def upload_finalize(upload_id):
+    upload = active_uploads.get(upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    with upload.lock:
+        if upload.closed:
+            return jsonify({'error': 'Upload not found'}), 404
+        if upload.offset != upload.size:
+            return jsonify({'error': 'Upload incomplete', 'offset': upload.offset}), 409
+        
+        sha256 = upload.hasher.hexdigest()
+        file_path = upload.finalize()
+        # The upload's reserved place passes straight to its job
+        with uploads_lock:
+            active_uploads.pop(upload_id, None)
+            worker = start_job(upload_id, file_path, upload.settings, sha256=sha256)
+    
+    return jsonify({
+        'job_id': upload_id,
+        'filename': upload.filename,
+        'sha256': sha256,
+        'status': worker.status,
+        'estimated_start': worker.estimated_start,
+        'estimated_finish': worker.estimated_finish
     })
 
+@app.route('/upload/<upload_id>', methods=['DELETE'])
+def upload_cancel(upload_id):
+    with uploads_lock:
+        upload = active_uploads.pop(upload_id, None)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    with upload.lock:
+        if not upload.closed:
+            upload.abort()
+    return jsonify({'upload_id': upload_id, 'status': 'cancelled'})
+
 @app.route('/job/<job_id>/status')
 def job_status(job_id):
     if job_id not in active_jobs:
@@ -162,10 +896,21 @@ def job_status(job_id):
     job = active_jobs[job_id]
     response = {
         'job_id': job_id,
-        'status': job.status
+        'status': job.status,
+        'tier': job.tier
     }
     
-    if job.status == 'completed' and job.result:
+    if job.sha256:
+        response['sha256'] = job.sha256
+    
+    if job.status in ('queued', 'running'):
+        response['audio_seconds'] = job.audio_seconds
+        response['estimated_start'] = job.estimated_start
+        response['estimated_finish'] = job.estimated_finish
+        if job.status == 'queued':
+            response['queue_position'] = job.queue_position
+    
+    if job.status in ('completed', 'refining') and job.result:
         response['result'] = job.result
     elif job.status == 'failed' and job.error:
         response['error'] = job.error
@@ -178,7 +923,9 @@ def download_file(job_id, format):
         return jsonify({'error': 'Job not found'}), 404
     
     job = active_jobs[job_id]
-    if job.status != 'completed' or not job.result:
+    # Draft outputs are downloadable while the refine pass runs; they are
+    # replaced atomically so a download never sees a partial file
+    if job.status not in ('completed', 'refining') or not job.result:
         return jsonify({'error': 'Transcription not completed'}), 400
     
     if format not in job.result['outputs']:
@@ -199,4 +946,11 @@ def handle_disconnect():
     print('Client disconnected')
 
 if __name__ == '__main__':
-    socketio.run(app, debug=True, host='0.0.0.0', port=5001)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    port = int(os.environ.get('WHISPERTRON_PORT', 5001))
+    debug = os.environ.get('WHISPERTRON_DEBUG', '1') != '0'
+    # Werkzeug refuses to serve without a terminal unless told to; only
+    # unattended runs (the load test, a service manager) should opt in.
+    allow_werkzeug = os.environ.get('WHISPERTRON_ALLOW_WERKZEUG', '0') == '1'
+    socketio.run(app, debug=debug, host='0.0.0.0', port=port,
+                 allow_unsafe_werkzeug=allow_werkzeug)
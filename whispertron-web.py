@@ -20,7 +20,7 @@ def install_web_dependencies():
         subprocess.run([venv_python, "-m", "pip", "install", "-r", web_requirements], check=True)
     else:
         # Install manually if requirements file doesn't exist
-        subprocess.run([venv_python, "-m", "pip", "install", "Flask==2.3.3", "Flask-SocketIO==5.3.6", "python-socketio==5.9.0", "eventlet==0.33.3"], check=True)
+        subprocess.run([venv_python, "-m", "pip", "install", "Flask==2.3.3", "Flask-SocketIO==5.3.6", "python-socketio==5.9.0", "simple-websocket==1.0.0"], check=True)
     
     print("Web dependencies installed successfully!")
 